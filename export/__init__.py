@@ -0,0 +1,241 @@
+import bz2
+import csv
+import decimal
+import gzip
+import lzma
+import os
+import time
+
+from ..logger import CLogger, Color
+
+try:  # опционально: выгрузка в Parquet
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+class ResultExporter:
+    """
+    Потоковая выгрузка результата запроса в файл CSV или Parquet (mysql, postgres).
+    Строки пишутся пачками по мере чтения: CSV - сразу в (сжатый) файл, Parquet - row group-ами
+    по row_group_size строк, поэтому память ограничена размером row group, а не результата.
+    Файл пишется во временный '<path>.tmp' и переименовывается только после успешного закрытия.
+    Бинарные значения (BLOB, bytea) в CSV пишутся в hex (MySQL UNHEX(), postgres decode(x, 'hex')).
+
+    Использование:
+        with ResultExporter("stat.csv.gz", names=["crc", "cnt"]) as exporter:
+            exporter.write(batch)  # сколько угодно раз
+        exporter.stats()           # строки, байты, время, строк/сек
+    """
+
+    FORMATS = ("csv", "parquet")
+    CSV_COMPRESSION = {"gzip": gzip.open, "bz2": bz2.open, "xz": lzma.open}
+    EXTENSIONS = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz"}
+    MAX_CNT_ROW_GROUP = 100000  # Кол-во строк в одной row group Parquet
+
+    def __init__(self, path: str, names: list, types: list = None, fmt: str = None, compression: str = None,
+                 row_group_size: int = None, header: bool = True, delimiter: str = ","):
+        """
+        :param path: путь к файлу
+        :param names: [] имен колонок
+        :param types: [] типов колонок: 'int', 'uint', 'float', ('decimal', precision, scale), 'bool', 'timestamp',
+        'date', 'time', 'duration', 'string', 'binary' или None - определить по данным первой row group
+        :param fmt: 'csv' или 'parquet' (None - по расширению файла: .parquet -> parquet, иначе csv)
+        :param compression: CSV - 'gzip', 'bz2', 'xz' (None - по расширению файла);
+        Parquet - кодек pyarrow ('snappy', 'zstd', 'gzip', ...; None - по умолчанию pyarrow)
+        :param row_group_size: кол-во строк в row group Parquet (по умолчанию MAX_CNT_ROW_GROUP)
+        :param header: CSV - писать строку с именами колонок
+        :param delimiter: CSV - разделитель
+        """
+        self.path = path
+        self.names = list(names)
+        self.types = list(types) if types else [None] * len(self.names)
+        self.fmt = fmt if fmt else "parquet" if path.endswith(".parquet") else "csv"
+        if self.fmt not in self.FORMATS:
+            raise ValueError(f"Unknown export format: {self.fmt!r}")
+        if self.fmt == "csv":
+            self.compression = compression if compression else self.EXTENSIONS.get(os.path.splitext(path)[1])
+            if self.compression and self.compression not in self.CSV_COMPRESSION:
+                raise ValueError(f"Unknown CSV compression: {self.compression!r}")
+        else:
+            if pyarrow is None:
+                raise ImportError("pyarrow is not installed")
+            self.compression = compression
+        self.row_group_size = row_group_size if row_group_size else self.MAX_CNT_ROW_GROUP
+        self.header = header
+        self.delimiter = delimiter
+        self.cnt_rows = 0
+        self.cnt_row_groups = 0
+        self.cnt_bytes = 0
+        self.start_time = None
+        self.end_time = None
+        self._tmp_path = f"{path}.tmp"
+        self._file = None
+        self._csv = None
+        self._parquet = None
+        self._schema = None
+        self._buffer = []
+        # CSV: колонки, где возможны bytes/memoryview (binary или тип не задан)
+        self._hex_columns = [i for i, type_column in enumerate(self.types) if type_column in ("binary", None)]
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, type_e, value_e, traceback_e):
+        if type_e is None:
+            self.close()
+        else:
+            self.abort()
+
+    def open(self) -> 'ResultExporter':
+        self.start_time = time.perf_counter()
+        if self.fmt == "csv":
+            if self.compression:
+                self._file = self.CSV_COMPRESSION[self.compression](self._tmp_path, "wt", newline="", encoding="utf-8")
+            else:
+                self._file = open(self._tmp_path, "w", newline="", encoding="utf-8")
+            self._csv = csv.writer(self._file, delimiter=self.delimiter)
+            if self.header:
+                self._csv.writerow(self.names)
+        return self
+
+    def write(self, rows: list) -> None:
+        """
+        Записать пачку строк
+        :param rows: []<tuple> в порядке names
+        """
+        if not rows:
+            return
+        self.cnt_rows += len(rows)
+        if self._csv is not None:
+            self._csv.writerows(self._csv_rows(rows) if self._hex_columns else rows)
+            return
+        self._buffer.extend(rows)
+        while len(self._buffer) >= self.row_group_size:
+            self._write_row_group(self._buffer[:self.row_group_size])
+            del self._buffer[:self.row_group_size]
+
+    def _csv_rows(self, rows: list) -> list:
+        """
+        Строки для CSV: bytes/memoryview -> hex (иначе csv пишет repr "b'..'" или "<memory at ...>")
+        """
+        result = []
+        for row in rows:
+            row = list(row)
+            for i in self._hex_columns:
+                if isinstance(row[i], (bytes, bytearray, memoryview)):
+                    row[i] = row[i].hex()
+            result.append(row)
+        return result
+
+    def close(self) -> None:
+        """
+        Дописать остаток и переименовать временный файл в path
+        """
+        if self.fmt == "parquet":
+            if self._buffer or self._parquet is None:
+                self._write_row_group(self._buffer)
+                self._buffer = []
+            self._parquet.close()
+        else:
+            self._file.close()
+        os.replace(self._tmp_path, self.path)
+        self.end_time = time.perf_counter()
+        self.cnt_bytes = os.path.getsize(self.path)
+
+    def abort(self) -> None:
+        """
+        Прервать выгрузку: закрыть и удалить временный файл
+        """
+        try:
+            if self._parquet is not None:
+                self._parquet.close()
+            if self._file is not None:
+                self._file.close()
+        finally:
+            if os.path.exists(self._tmp_path):
+                os.remove(self._tmp_path)
+            self.end_time = time.perf_counter()
+
+    def _write_row_group(self, rows: list) -> None:
+        columns = list(zip(*rows)) if rows else [()] * len(self.names)
+        if self._schema is None:
+            self._schema = pyarrow.schema([(name, self._arrow_type(type_column, values))
+                                           for name, type_column, values in zip(self.names, self.types, columns)])
+            self._parquet = pyarrow.parquet.ParquetWriter(self._tmp_path, self._schema,
+                                                          **({"compression": self.compression}
+                                                             if self.compression else {}))
+        arrays = [pyarrow.array(self._arrow_values(field.type, values), type=field.type)
+                  for field, values in zip(self._schema, columns)]
+        self._parquet.write_table(pyarrow.Table.from_arrays(arrays, schema=self._schema))
+        self.cnt_row_groups += 1
+
+    @staticmethod
+    def _arrow_type(type_column: any, values: any) -> any:
+        """
+        Тип колонки Parquet: по types, иначе по значениям первой row group (все NULL - строка)
+        """
+        if isinstance(type_column, tuple) and type_column[0] == "decimal":
+            precision, scale = type_column[1], type_column[2]
+            if precision <= 38:
+                return pyarrow.decimal128(precision, scale)
+            return pyarrow.decimal256(precision, scale) if precision <= 76 else pyarrow.string()
+        if type_column == "int":
+            return pyarrow.int64()
+        if type_column == "uint":
+            return pyarrow.uint64()
+        if type_column == "float":
+            return pyarrow.float64()
+        if type_column == "bool":
+            return pyarrow.bool_()
+        if type_column == "timestamp":
+            return pyarrow.timestamp("us")
+        if type_column == "date":
+            return pyarrow.date32()
+        if type_column == "time":
+            return pyarrow.time64("us")
+        if type_column == "duration":
+            return pyarrow.duration("us")
+        if type_column == "string":
+            return pyarrow.string()
+        if type_column == "binary":
+            return pyarrow.binary()
+        inferred = pyarrow.array(values).type if values else pyarrow.null()
+        return pyarrow.string() if pyarrow.types.is_null(inferred) else inferred
+
+    @staticmethod
+    def _arrow_values(arrow_type: any, values: any) -> any:
+        if pyarrow.types.is_floating(arrow_type):  # DECIMAL -> float
+            return [float(v) if isinstance(v, decimal.Decimal) else v for v in values]
+        if pyarrow.types.is_string(arrow_type):  # DECIMAL вне точности Arrow, SET и прочее -> строка
+            return [v if v is None or isinstance(v, str) else
+                    v.decode("utf-8", "replace") if isinstance(v, bytes) else str(v) for v in values]
+        if pyarrow.types.is_binary(arrow_type):  # memoryview (postgres bytea) -> bytes
+            return [v if v is None or isinstance(v, bytes) else bytes(v) for v in values]
+        return values
+
+    @property
+    def duration(self) -> float:
+        if self.start_time is None:
+            return 0.0
+        return (self.end_time if self.end_time else time.perf_counter()) - self.start_time
+
+    def stats(self) -> dict:
+        duration = self.duration
+        return {"path": self.path, "format": self.fmt, "compression": self.compression, "rows": self.cnt_rows,
+                "row_groups": self.cnt_row_groups, "bytes": self.cnt_bytes, "duration": duration,
+                "rows_per_sec": self.cnt_rows / duration if duration > 0 else 0.0,
+                "bytes_per_sec": self.cnt_bytes / duration if duration > 0 else 0.0}
+
+    def log_stats(self) -> dict:
+        """
+        Вывести в лог итог выгрузки (строки, размер, пропускная способность)
+        :return: stats()
+        """
+        stats = self.stats()
+        CLogger.info(f"[EXPORT] {Color.Blue}{stats['path']}{CLogger.infoColor}: {stats['rows']} rows, "
+                     f"{stats['bytes'] / 1024 / 1024:.1f} MB ({stats['format']}"
+                     f"{', ' + stats['compression'] if stats['compression'] else ''}) in {stats['duration']:.2f} sec. "
+                     f"{stats['rows_per_sec']:,.0f} rows/sec, {stats['bytes_per_sec'] / 1024 / 1024:.1f} MB/sec")
+        return stats
@@ -5,6 +5,7 @@ import ssl
 import traceback
 from email.mime.text import MIMEText
 import functools
+import random
 import time
 
 from .color import Color
@@ -100,6 +101,9 @@ class ColorLogger:
         if self.custom_email_config:
             email_send(**self.custom_email_config, message=message)
 
+    def is_debug_enabled(self) -> bool:
+        return self.debug_info_on and self.Logger.isEnabledFor(logging.DEBUG)
+
     def info(self, text: str):
         self.Logger.info(f"{self.infoColor}{text}{self.Reset}")
 
@@ -140,6 +144,87 @@ class ColorLogger:
 CLogger = ColorLogger(Logger)
 
 
+class _QueryRecord:
+    """
+    Ленивое сообщение лога запроса: строка форматируется только если запись действительно выводится
+    """
+
+    __slots__ = ('query_logger', 'sql', 'args', 'many')
+
+    def __init__(self, query_logger, sql, args, many):
+        self.query_logger = query_logger
+        self.sql = sql
+        self.args = args
+        self.many = many
+
+    def __str__(self):
+        ql = self.query_logger
+        sql = self.sql if ql.max_len_sql is None or len(self.sql) <= ql.max_len_sql else \
+            f"{self.sql[:ql.max_len_sql]}... <{len(self.sql)} chars>"
+        text = f"{Color.Yellow}\tExecute sql query:\n\t\t{Color.Light_Cyan}{sql}{ColorLogger.Reset}"
+        if self.args is not None:
+            args = self.args[:ql.max_cnt_args] if self.many else self.args
+            text += f"\n{Color.Yellow}\tSQL {'data ' if self.many else ''}args:\n" \
+                f"\t\t{Color.Light_Magenta}{args}{ColorLogger.Reset}"
+        return text
+
+
+class QueryLogger:
+    """
+    Структурированный лог sql запросов БД.
+        * ленивое форматирование - строка собирается только при реальном выводе записи
+        * обрезка длинного sql (max_len_sql) и данных executemany (max_cnt_args)
+        * сэмплирование - логируется доля sample_rate запросов
+        * поля sql/sql_args доступны обработчикам logging через record (extra)
+    Выключенный лог (enabled=False или уровень INFO отключен) стоит одну проверку на запрос.
+    """
+
+    __slots__ = ('logger', 'enabled', 'max_len_sql', 'max_cnt_args', 'sample_rate')
+
+    def __init__(self, logger, enabled: bool = True, max_len_sql: any = 10000, max_cnt_args: int = 10,
+                 sample_rate: float = 1.0):
+        """
+        :param logger: logging.Logger
+        :param enabled: логировать ли запросы
+        :param max_len_sql: макс. длина sql в логе (None - без обрезки)
+        :param max_cnt_args: макс. кол-во строк данных executemany в логе
+        :param sample_rate: доля логируемых запросов (0..1)
+        """
+        self.logger = logger
+        self.enabled = enabled
+        self.max_len_sql = max_len_sql
+        self.max_cnt_args = max_cnt_args
+        self.sample_rate = sample_rate
+
+    def config(self, enabled: bool = True, max_len_sql: any = 10000, max_cnt_args: int = 10,
+               sample_rate: float = 1.0):
+        self.enabled = enabled
+        self.max_len_sql = max_len_sql
+        self.max_cnt_args = max_cnt_args
+        self.sample_rate = sample_rate
+
+    def is_enabled(self) -> bool:
+        """
+        Нужно ли логировать очередной запрос (с учетом сэмплирования)
+        """
+        return self.enabled and self.logger.isEnabledFor(logging.INFO) and \
+            (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    def log(self, sql: str, args: any = None, many: bool = False, db_info: any = None):
+        """
+        Записать запрос в лог (вызывать после проверки is_enabled)
+        :param sql: запрос
+        :param args: параметры запроса или данные executemany
+        :param many: args - данные executemany
+        :param db_info: информация о БД
+        """
+        self.logger.info("%s", _QueryRecord(self, sql, args, many),
+                         extra={"sql": sql, "sql_args": args, "db_info": db_info})
+
+
+QLogger = QueryLogger(Logger)
+
+
 class BaseExceptionSLL(Exception):
     def __init__(self, message: str, inst: any):
         # Call the base class constructor with the parameters it needs
@@ -151,6 +236,16 @@ class BaseExceptionSLL(Exception):
         # Now for your custom code...
         self.inst = inst
 
+    def __reduce__(self):
+        # pickle (передача из процесса пула в основной процесс) без повторного вызова __init__ с другими аргументами
+        return _restore_exception_sll, (self.__class__, self.args), self.__dict__
+
+
+def _restore_exception_sll(cls: type, args: tuple) -> BaseExceptionSLL:
+    inst = cls.__new__(cls)
+    Exception.__init__(inst, *args)
+    return inst
+
 
 class LockerCriticalExceptionSLL(BaseExceptionSLL):
     def __init__(self, message: str, inst: any):
@@ -226,6 +321,8 @@ def timer(func):
 
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
+        if not CLogger.is_debug_enabled():  # замер и форматирование строки только если debug лог выводится
+            return func(*args, **kwargs)
         start_time = time.perf_counter()
         value = func(*args, **kwargs)
         end_time = time.perf_counter()
@@ -0,0 +1,209 @@
+import bisect
+import re
+import threading
+
+from ..logger import CLogger, Color
+
+
+class QueryStats:
+    """
+    Накопленная статистика одного шаблона запроса
+    """
+
+    __slots__ = ('source', 'template', 'count', 'errors', 'total_time', 'min_time', 'max_time', 'rows', 'bytes_sent',
+                 'buckets')
+
+    def __init__(self, source: str, template: str, cnt_buckets: int):
+        self.source = source
+        self.template = template
+        self.count = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.min_time = None
+        self.max_time = 0.0
+        self.rows = 0
+        self.bytes_sent = 0
+        self.buckets = [0] * cnt_buckets
+
+    def add(self, bucket: int, seconds: float, rows: int, bytes_sent: int, error: bool) -> None:
+        self.count += 1
+        self.errors += 1 if error else 0
+        self.total_time += seconds
+        self.min_time = seconds if self.min_time is None or seconds < self.min_time else self.min_time
+        self.max_time = seconds if seconds > self.max_time else self.max_time
+        self.rows += rows
+        self.bytes_sent += bytes_sent
+        self.buckets[bucket] += 1
+
+    def merge(self, other: 'QueryStats') -> None:
+        self.count += other.count
+        self.errors += other.errors
+        self.total_time += other.total_time
+        if other.min_time is not None and (self.min_time is None or other.min_time < self.min_time):
+            self.min_time = other.min_time
+        self.max_time = max(self.max_time, other.max_time)
+        self.rows += other.rows
+        self.bytes_sent += other.bytes_sent
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+
+    def as_dict(self, bounds: tuple) -> dict:
+        return {"source": self.source, "template": self.template, "count": self.count, "errors": self.errors,
+                "total_time": self.total_time, "avg_time": self.total_time / self.count if self.count else 0.0,
+                "min_time": self.min_time, "max_time": self.max_time,
+                "p50": self.percentile(bounds, 0.5), "p95": self.percentile(bounds, 0.95),
+                "p99": self.percentile(bounds, 0.99), "rows": self.rows, "bytes_sent": self.bytes_sent,
+                "histogram": dict(zip([*bounds, float("inf")], self.buckets))}
+
+    def percentile(self, bounds: tuple, q: float) -> any:
+        """
+        Оценка перцентиля по гистограмме (верхняя граница корзины, для последней корзины - max_time)
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        cnt = 0
+        for i, n in enumerate(self.buckets):
+            cnt += n
+            if cnt >= rank:
+                return min(bounds[i], self.max_time) if i < len(bounds) else self.max_time
+        return self.max_time
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик запросов к БД (mysql, postgres): по каждому шаблону запроса (литералы заменены на '?')
+    кол-во выполнений, ошибки, гистограмма времени, строки (затронутые/полученные) и отправленные байты.
+    Шаблон вычисляется не при записи, а при snapshot() (или при переполнении MAX_SIZE_PENDING): запрос с
+    литералами почти всегда уникален, регулярные выражения на каждый запрос стоили бы дороже самого учета.
+    Потокобезопасен. Использование:
+        Metrics.snapshot()  # {} шаблон -> статистика
+        Metrics.dump()      # топ запросов в лог
+        Metrics.reset()
+    """
+
+    BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60)  # Границы корзин гистограммы sec
+    MAX_LEN_TEMPLATE_CACHE = 1024  # sql длиннее (символов) не запоминается в кэше sql -> шаблон
+    MAX_SIZE_TEMPLATE_CACHE = 4 * 1024 * 1024  # Макс. суммарная длина sql в кэше sql -> шаблон (символов)
+    MAX_SIZE_PENDING = 4 * 1024 * 1024  # Макс. суммарная длина sql без вычисленного шаблона (символов)
+
+    RE_STRING = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+    RE_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.IGNORECASE)
+    RE_PARAM = re.compile(r"%s|%\(\w+\)s")
+    RE_LIST = re.compile(r"\(\s*(?:\?|NULL)(?:\s*,\s*(?:\?|NULL))*\s*\)", re.IGNORECASE)
+    RE_ROWS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+    RE_WHITESPACE = re.compile(r"\s+")
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._stats = {}  # (source, шаблон) -> QueryStats
+        self._pending = {}  # (source, sql) -> QueryStats, шаблон еще не вычислен
+        self._size_pending = 0
+        self._templates = {}
+        self._size_templates = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def normalize(cls, sql: str) -> str:
+        """
+        Шаблон запроса: строки и числа -> ?, списки значений 'IN (...)' и строки VALUES схлопываются
+        :param sql: запрос
+        :return: шаблон
+        """
+        template = cls.RE_STRING.sub("?", sql)
+        template = cls.RE_PARAM.sub("?", template)
+        template = cls.RE_NUMBER.sub("?", template)
+        template = cls.RE_LIST.sub("(...)", template)
+        template = cls.RE_ROWS.sub("(...)", template)
+        return cls.RE_WHITESPACE.sub(" ", template).strip().rstrip(";")
+
+    def template(self, sql: str) -> str:
+        template = self._templates.get(sql)
+        if template is None:
+            template = self.normalize(sql)
+            if len(sql) <= self.MAX_LEN_TEMPLATE_CACHE:
+                if self._size_templates + len(sql) > self.MAX_SIZE_TEMPLATE_CACHE:
+                    self._templates.clear()
+                    self._size_templates = 0
+                self._templates[sql] = template
+                self._size_templates += len(sql)
+        return template
+
+    def record(self, source: str, sql: str, seconds: float, rows: int = 0, bytes_sent: int = 0,
+               error: bool = False) -> None:
+        """
+        Учесть выполнение запроса
+        :param source: источник ('mysql', 'postgres')
+        :param sql: запрос (или шаблон с %s)
+        :param seconds: время выполнения
+        :param rows: кол-во затронутых/полученных строк
+        :param bytes_sent: кол-во отправленных байт (оценка)
+        :param error: запрос завершился ошибкой
+        """
+        bucket = bisect.bisect_left(self.BUCKETS, seconds)
+        with self._lock:
+            template = self._templates.get(sql)
+            key, registry = ((source, template), self._stats) if template is not None else \
+                ((source, sql), self._pending)
+            stats = registry.get(key)
+            if stats is None:
+                stats = QueryStats(source, template, len(self.BUCKETS) + 1)
+                registry[key] = stats
+                if template is None:
+                    self._size_pending += len(sql)
+            stats.add(bucket, seconds, rows, bytes_sent, error)
+            if self._size_pending > self.MAX_SIZE_PENDING:
+                self._fold()
+
+    def _fold(self) -> None:
+        """
+        Вычислить шаблоны накопленных sql и перенести их статистику в статистику шаблонов (под self._lock)
+        """
+        for (source, sql), pending in self._pending.items():
+            template = self.template(sql)
+            stats = self._stats.get((source, template))
+            if stats is None:
+                pending.template = template
+                self._stats[(source, template)] = pending
+            else:
+                stats.merge(pending)
+        self._pending = {}
+        self._size_pending = 0
+
+    def snapshot(self) -> list:
+        """
+        Копия накопленной статистики
+        :return: [] of {} по шаблонам, по убыванию суммарного времени
+        """
+        with self._lock:
+            self._fold()
+            snapshot = [stats.as_dict(self.BUCKETS) for stats in self._stats.values()]
+        return sorted(snapshot, key=lambda d: d["total_time"], reverse=True)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats = {}
+            self._pending = {}
+            self._size_pending = 0
+
+    def dump(self, top: int = 20, max_len_template: int = 200) -> None:
+        """
+        Вывести в лог топ шаблонов запросов по суммарному времени
+        :param top: кол-во шаблонов
+        :param max_len_template: макс. длина шаблона в выводе
+        """
+        snapshot = self.snapshot()
+        if not snapshot:
+            return
+        lines = [f"{Color.Magenta}Query metrics (top {min(top, len(snapshot))} of {len(snapshot)} by total time):"]
+        for d in snapshot[:top]:
+            template = d["template"] if len(d["template"]) <= max_len_template else \
+                f"{d['template'][:max_len_template]}..."
+            lines.append(f"{Color.Yellow}\t[{d['source']}] {Color.Light_Cyan}{template}\n"
+                         f"{CLogger.infoColor}\t\tcount={d['count']} errors={d['errors']} "
+                         f"total={d['total_time']:.3f}s avg={d['avg_time'] * 1000:.2f}ms "
+                         f"p50<={d['p50'] * 1000:.1f}ms p95<={d['p95'] * 1000:.1f}ms "
+                         f"max={d['max_time'] * 1000:.1f}ms rows={d['rows']} bytes_sent={d['bytes_sent']}")
+        CLogger.info("\n".join(lines))
+
+
+Metrics = MetricsRegistry()
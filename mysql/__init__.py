@@ -1,15 +1,36 @@
+import collections
+import concurrent.futures
+import contextlib
 import datetime
+import hashlib
+import heapq
 import itertools
 import json
+import os
+import queue
+import random
+import re
+import tempfile
+import threading
 import time
+import weakref
 import pymysql
+from pymysql.constants import FIELD_TYPE, FLAG
 
 
 from ..logger import DbCriticalExceptionSLL, DbSqlQueryExceptionSLL, DemultiplexorCriticalExceptionSLL,\
-    DemultiplexorExceptionSLL, unknown_exception_catcher, sll_exception_catcher, timer, deprecated,  Color, CLogger
+    DemultiplexorExceptionSLL, unknown_exception_catcher, sll_exception_catcher, timer, deprecated,  Color, CLogger, \
+    QLogger
 from ..mock import MockingHelper
+from ..metrics import Metrics
+from ..export import ResultExporter
 from ..progress_bar import ProgressBar
 from .. import other
+from .pool import MySQLConnectionPool
+from .decoder import LogDecoder
+from .columnar import LogColumns, ResultColumns
+from .cache import QueryCache
+from .transaction import Transaction
 
 
 class BaseMySQLDB:
@@ -19,20 +40,45 @@ class BaseMySQLDB:
 
     MAX_CNT_FAST_DEBUG = 5000  # Макс. кол-во обрабатываемых записей в режиме быстрой отладки
     MAX_CNT_DELETE_ROW = 10000  # Макс. кол-во удаляемых строк за один раз в одном запросе
-    MAX_CNT_EXECUTEMANY_DATA = 25000  # Макс. кол-во данных в одном executemany запросе
+    MAX_CNT_EXECUTEMANY_DATA = 25000  # Макс. кол-во данных в одном executemany запросе (начальный размер пачки)
+    MIN_CNT_EXECUTEMANY_DATA = 1000  # Мин. кол-во данных в одном executemany запросе (адаптивная пачка)
+    LIMIT_CNT_EXECUTEMANY_DATA = 250000  # Предел роста адаптивной пачки executemany (узкие строки)
+    EXECUTEMANY_TARGET_LATENCY = 1.0  # Целевое время одной пачки executemany sec
+    MAX_CNT_ROW_SIZE_SAMPLE = 100  # Кол-во строк для оценки размера строки executemany
     MAX_CNT_FETCH_ALL = 100000  # Макс. кол-во строк получаемых из одного запроса fetchall
     MAX_CNT_VIEW_LOG_DATA = 10  # Макс. кол-во строк для отображения данных в логировании запросов
+    MAX_CNT_STREAM_BATCH = 10000  # Кол-во строк в одной пачке при потоковом чтении (unbuffered SSCursor)
+    MAX_CNT_LOAD_DATA_INFILE = 1000000  # Макс. кол-во строк в одном файле LOAD DATA LOCAL INFILE
 
-    _db_connection = None
-    _timeout_reconnect_db = 10  # Таймаут попыток переподключится к БД 1 sec
-    _max_cnt_reconnect = 10  # Максимальное число попыток подключится к БД
+    _connection = None
+    _timeout_reconnect_db = 10  # Макс. пауза между попытками переподключится к БД sec
+    _timeout_reconnect_db_min = 0.5  # Начальная пауза между попытками (растет x2 с каждой попыткой, со случ. разбросом)
+    _max_cnt_connect = 100  # Максимальное число попыток подключится к БД (connect)
+    _max_cnt_reconnect = 10  # Максимальное число попыток переподключится к БД (разрыв соединения во время запроса)
+    # Коды ошибок MySQL разрыва соединения: server has gone away, lost connection, can't connect, server shutdown
+    CONNECTION_LOST_ERRORS = frozenset((2006, 2013, 2003, 2055, 1053))
+    DUPLICATE_KEY_ERROR = 1062
+    # Запросы статуса реплики (новый синтаксис MySQL 8.0.22+, затем старый, удаленный в 8.4) и колонка отставания
+    REPLICA_STATUS_QUERIES = (("SHOW REPLICA STATUS;", "Seconds_Behind_Source"),
+                              ("SHOW SLAVE STATUS;", "Seconds_Behind_Master"))
+    # Типы колонок выгрузки export_query (целые, DECIMAL и строки - по флагам полей в _export_types)
+    EXPORT_TYPES = {FIELD_TYPE.FLOAT: "float", FIELD_TYPE.DOUBLE: "float", FIELD_TYPE.DATETIME: "timestamp",
+                    FIELD_TYPE.TIMESTAMP: "timestamp", FIELD_TYPE.DATE: "date", FIELD_TYPE.TIME: "duration",
+                    FIELD_TYPE.JSON: "string"}
+    EXPORT_TEXT_TYPES = frozenset((FIELD_TYPE.VARCHAR, FIELD_TYPE.VAR_STRING, FIELD_TYPE.STRING, FIELD_TYPE.TINY_BLOB,
+                                   FIELD_TYPE.MEDIUM_BLOB, FIELD_TYPE.LONG_BLOB, FIELD_TYPE.BLOB, FIELD_TYPE.BIT,
+                                   FIELD_TYPE.GEOMETRY))
+    BINARY_CHARSET = 63  # charsetnr бинарных колонок (BLOB, BINARY, BIT) - значения bytes, а не str
+    _max_allowed_packet_reserve = 1024  # Запас (байт) от max_allowed_packet под заголовки пакета и ON DUPLICATE часть
 
     def __init__(self,
                  db_config: dict,
                  auto_commit: bool = True,
                  fast_debug: bool = False,
                  charset: any = None,  # latin-1, utf8, utf8mb4
-                 local_infile: int = 0):
+                 local_infile: int = 0,
+                 pool: any = None):
+        self.db_config = db_config
         self.db_host = db_config["host"]
         self.db_port = db_config["port"]
         self.db_user = db_config["user"]
@@ -42,6 +88,13 @@ class BaseMySQLDB:
         self.fast_debug = fast_debug
         self.charset = charset
         self.local_infile = local_infile
+        self._max_allowed_packet = weakref.WeakKeyDictionary()  # значение @@max_allowed_packet для соединения
+        self.executemany_stats = None  # статистика пачек последнего executemany (execute)
+        self._transactions = weakref.WeakKeyDictionary()  # Transaction открытая в соединении (transaction())
+        self.transaction_stats = None  # статистика последней завершенной transaction()
+        self.pool = pool  # MySQLConnectionPool, если задан - соединения берутся из него
+        self._local = threading.local()  # соединение, привязанное к потоку через worker_connection()
+        self._replica_status_query = None  # подошедший серверу запрос из REPLICA_STATUS_QUERIES
 
     def __enter__(self):
         return self if self.connect() else None
@@ -49,9 +102,149 @@ class BaseMySQLDB:
     def __exit__(self, type_e, value_e, traceback_e):
         self.cleanup()
 
+    @property
+    def _db_connection(self) -> any:
+        """
+        Текущее соединение: привязанное к потоку (worker_connection), иначе основное соединение объекта
+        """
+        connection = getattr(self._local, "connection", None)
+        return connection if connection is not None else self._connection
+
+    @_db_connection.setter
+    def _db_connection(self, connection: any) -> None:
+        self._connection = connection
+
     def db_info(self) -> str:
         return f"{self.db_host}:{self.db_port}/{self.db_name}"
 
+    def _new_connection(self) -> any:
+        """
+        Открыть новое соединение с БД (одна попытка)
+        :return: pymysql.Connection
+        """
+        return pymysql.connect(host=self.db_host,
+                               port=int(self.db_port),
+                               user=self.db_user,
+                               passwd=self.db_pass,
+                               db=self.db_name,
+                               autocommit=self.autocommit,
+                               local_infile=self.local_infile)
+
+    def _acquire(self) -> any:
+        """
+        Взять соединение из пула с autocommit этого объекта (пул может быть настроен иначе)
+        :return: pymysql.Connection
+        """
+        connection = self.pool.acquire()
+        try:
+            if connection.get_autocommit() != self.autocommit:
+                connection.autocommit(self.autocommit)
+        except Exception:
+            self.pool.release(connection, discard=True)
+            raise
+        return connection
+
+    @contextlib.contextmanager
+    def worker_connection(self):
+        """
+        Привязать к текущему потоку отдельное соединение на время блока with: из пула (если задан) или новое.
+        Позволяет нескольким потокам безопасно выполнять запросы через один объект БД.
+        :return: self
+        """
+        previous = getattr(self._local, "connection", None)
+        connection = self._acquire() if self.pool else self._new_connection()
+        self._local.connection = connection
+        try:
+            if not self.pool and self.charset:
+                self.set_charset(self.charset)
+            yield self
+        finally:
+            self._local.connection = previous
+            if self.pool:
+                self.pool.release(connection, discard=not connection.open)
+            elif connection.open:
+                connection.close()
+
+    @contextlib.contextmanager
+    def temporary_table(self, table: str, columns: [], keys: [] = None):
+        """
+        Временная таблица на время блока with в текущем соединении: колонки (и их типы) берутся из table
+         'CREATE TEMPORARY TABLE {tmp} (PRIMARY KEY ({keys})) SELECT {columns} FROM {table} LIMIT 0;'
+        :param table: исходная таблица
+        :param columns: [] колонок
+        :param keys: [] колонок первичного ключа временной таблицы
+        :return: имя временной таблицы (в обратных кавычках)
+        """
+        tmp_table = f"`tmp_{re.sub(r'[^0-9a-zA-Z_]', '_', table.split('.')[-1].strip('`'))}_{threading.get_ident()}`"
+        primary_key = f"(PRIMARY KEY ({','.join(keys)})) " if keys else ""
+        if not self.execute(sql=f"CREATE TEMPORARY TABLE {tmp_table} {primary_key}"
+                                f"SELECT {','.join(columns)} FROM {table} LIMIT 0;", silence=True):
+            raise DbCriticalExceptionSLL(message=f"Can't create temporary table {tmp_table}! {self.db_info()}",
+                                         inst=None)
+        try:
+            yield tmp_table
+        finally:
+            self.execute(sql=f"DROP TEMPORARY TABLE IF EXISTS {tmp_table};", silence=True)
+
+    @contextlib.contextmanager
+    def transaction(self, max_statements: int = 0, max_bytes: int = 0):
+        """
+        Транзакция на время блока with (group commit): запросы блока не коммитятся по одному,
+        commit делается в конце блока, а также каждые max_statements запросов / max_bytes отправленных байт.
+        Если в блоке был запрос с ошибкой (SLL исключение) или блок завершился исключением - rollback
+        (до последнего промежуточного commit). Вложенный блок становится частью внешней транзакции.
+            with db.transaction(max_statements=1000) as tx:
+                ...
+            tx.ok, tx.stats()
+        :param max_statements: промежуточный commit после стольких запросов (0 - нет)
+        :param max_bytes: промежуточный commit после стольких отправленных байт (0 - нет)
+        :return: Transaction
+        """
+        connection = self._db_connection
+        tx = self._transactions.get(connection)
+        if tx is not None:
+            yield tx
+            return
+        tx = Transaction(max_statements=max_statements, max_bytes=max_bytes)
+        connection.begin()
+        self._transactions[connection] = tx
+        try:
+            yield tx
+        except Exception:
+            tx.failed = True
+            raise
+        finally:
+            del self._transactions[connection]
+            try:
+                if tx.failed:
+                    connection.rollback()
+                    tx.rolled_back()
+                else:
+                    connection.commit()
+                    tx.committed()
+            except Exception as inst:
+                raise DbCriticalExceptionSLL(message=f"Transaction {'rollback' if tx.failed else 'commit'} failed! "
+                                                     f"{self.db_info()}", inst=inst)
+            finally:
+                tx.finish()
+                self.transaction_stats = tx.stats()
+            status = f"{Color.Light_Red}ROLLBACK" if tx.failed else "COMMIT"
+            CLogger.info(f"\tTransaction {status}{CLogger.infoColor}: {tx.total_statements} statements, "
+                         f"{tx.commits} commits in {tx.duration:.3f} sec ({tx.commits_per_sec:.1f} commits/sec)")
+
+    def _after_execute(self, sql: str, execute_many_data: any = None, args: any = None) -> None:
+        """
+        Commit после запроса: сразу (auto_commit=False) или group commit открытой transaction()
+        """
+        tx = self._transactions.get(self._db_connection)
+        if tx is not None:
+            if tx.add(self._estimate_bytes_sent(sql, execute_many_data, args) if tx.max_bytes else 0):
+                self._db_connection.commit()
+                tx.committed()
+                self._db_connection.begin()
+        elif not self.autocommit:
+            self._db_connection.commit()  # if autocommit true; doesn't need
+
     @unknown_exception_catcher
     @sll_exception_catcher
     def connect(self) -> bool:
@@ -61,28 +254,25 @@ class BaseMySQLDB:
             * True - successful
             * False - fail
         """
-        cnt = 0
+        if self.pool:
+            self._db_connection = self._acquire()
+            CLogger.info(f"[CONNECT] Connect to DB: {Color.Blue}{self.db_info()}. {Color.Light_Green}FROM POOL!")
+            return True
         inst_save = None
-        while cnt < 100:
+        for cnt in range(1, self._max_cnt_connect + 1):
             try:
-                cnt += 1
-                self._db_connection = pymysql.connect(host=self.db_host,
-                                                      port=int(self.db_port),
-                                                      user=self.db_user,
-                                                      passwd=self.db_pass,
-                                                      db=self.db_name,
-                                                      autocommit=self.autocommit,
-                                                      local_infile=self.local_infile)
+                self._db_connection = self._new_connection()
                 break
             except Exception as inst:
                 inst_save = inst
+                timeout = self._reconnect_delay(cnt)
                 CLogger.exception(inst,
                                   f"[CONNECT] Can't connect to DB: {self.db_info()}.\n"
-                                  f"Attempt {cnt}/100. Timeout: {self._timeout_reconnect_db} sec")
-                time.sleep(self._timeout_reconnect_db)
-        if cnt == self._max_cnt_reconnect:  # если не получилось подключиться пишем письмо об ошибке
-            raise DbCriticalExceptionSLL(message="Can't connect to database :( ( Attemp == 100 (100*1 sec) ). Exit. ",
-                                         inst=inst_save)
+                                  f"Attempt {cnt}/{self._max_cnt_connect}. Timeout: {timeout:.1f} sec")
+                time.sleep(timeout)
+        else:  # если не получилось подключиться пишем письмо об ошибке
+            raise DbCriticalExceptionSLL(message=f"Can't connect to database :( ( Attemp == {self._max_cnt_connect} ). "
+                                                 f"Exit. ", inst=inst_save)
 
         CLogger.info(f"[CONNECT] Connect to DB: {Color.Blue}{self.db_info()}. {Color.Light_Green}OPENED!")
         if self.charset:
@@ -90,11 +280,61 @@ class BaseMySQLDB:
             return self.set_charset(self.charset)
         return True
 
+    def _reconnect_delay(self, attempt: int) -> float:
+        """
+        Пауза перед попыткой attempt: экспоненциальный рост от _timeout_reconnect_db_min до _timeout_reconnect_db,
+        со случайным разбросом ("full jitter"), чтобы параллельные скрипты не переподключались одновременно
+        :param attempt: номер попытки (с 1)
+        :return: пауза sec
+        """
+        return random.uniform(0, min(self._timeout_reconnect_db, self._timeout_reconnect_db_min * 2 ** attempt))
+
+    def reconnect(self) -> bool:
+        """
+        Восстановить текущее соединение после разрыва (тот же объект соединения, ping с reconnect),
+        не больше _max_cnt_reconnect попыток с экспоненциальной паузой
+        :return:
+            * True - successful
+            * False - fail
+        """
+        connection = self._db_connection
+        for cnt in range(1, self._max_cnt_reconnect + 1):
+            timeout = self._reconnect_delay(cnt)
+            CLogger.warning(f"[RECONNECT] DB: {self.db_info()}. Attempt {cnt}/{self._max_cnt_reconnect} "
+                            f"after {timeout:.1f} sec")
+            time.sleep(timeout)
+            try:
+                connection.ping(reconnect=True)
+                if self.charset:
+                    self.set_charset(self.charset)
+                CLogger.info(f"[RECONNECT] Connect to DB: {Color.Blue}{self.db_info()}. {Color.Light_Green}RESTORED!")
+                return True
+            except Exception as inst:
+                CLogger.exception(inst, f"[RECONNECT] Can't reconnect to DB: {self.db_info()}")
+        return False
+
+    def _is_connection_lost(self, inst: any) -> bool:
+        if isinstance(inst, pymysql.err.InterfaceError):
+            return True
+        return isinstance(inst, pymysql.err.OperationalError) and bool(inst.args) and \
+            inst.args[0] in self.CONNECTION_LOST_ERRORS
+
+    def _is_duplicate_key(self, inst: any) -> bool:
+        return isinstance(inst, pymysql.err.IntegrityError) and bool(inst.args) and \
+            inst.args[0] == self.DUPLICATE_KEY_ERROR
+
     def cleanup(self) -> None:
         """
         Закрыть соединение с БД
         :return: None
         """
+        if self.pool:
+            if self._connection is None:  # соединение не взято (или уже возвращено)
+                return
+            CLogger.info(f"[CLEANUP] Connect to DB: {Color.Blue}{self.db_info()}. {Color.Light_Red}RETURN TO POOL!")
+            self.pool.release(self._connection, discard=not self._connection.open)
+            self._connection = None
+            return
         CLogger.info(f"[CLEANUP] Connect to DB: {Color.Blue}{self.db_info()}. {Color.Light_Red}CLOSED!")
         self._db_connection.close()
 
@@ -114,43 +354,259 @@ class BaseMySQLDB:
                    self._execute(cursor, sql=f"SET CHARACTER SET {chs};") and \
                    self._execute(cursor, sql=f"SET character_set_connection={chs};")
 
+    def get_max_allowed_packet(self) -> int:
+        """
+        Значение @@max_allowed_packet сервера, запрашивается один раз на соединение
+        :return: макс. размер пакета в байтах (при ошибке - дефолтный лимит pymysql на длину запроса)
+        """
+        packet = self._max_allowed_packet.get(self._db_connection)
+        if packet is None:
+            with self._db_connection.cursor() as cursor:
+                r = self._execute_and_fetch_all(cursor=cursor, sql="SELECT @@max_allowed_packet;", silence=True)
+            packet = int(r[0][0][0]) if r and r[0] else pymysql.cursors.Cursor.max_stmt_length
+            self._max_allowed_packet[self._db_connection] = packet
+        return packet
+
+    def get_replication_lag(self) -> any:
+        """
+        Отставание реплики от мастера: Seconds_Behind_Source из SHOW REPLICA STATUS (MySQL 8.0.22+),
+        на старых серверах - Seconds_Behind_Master из SHOW SLAVE STATUS (подошедший запрос запоминается)
+        :return:
+            * Lag<int> - отставание в секундах (0 - БД не является репликой)
+            * None     - репликация остановлена или ошибка запроса
+        """
+        queries = self.REPLICA_STATUS_QUERIES if self._replica_status_query is None else \
+            (self._replica_status_query,)
+        with self._db_connection.cursor() as cursor:
+            for sql, column in queries:
+                try:
+                    self._execute_query(cursor=cursor, sql=sql, silence=True)
+                except DbSqlQueryExceptionSLL as inst_query:
+                    if self._is_connection_lost(inst_query.inst):
+                        CLogger.exception(inst_query, f"[REPLICATION LAG] {self.db_info()}")
+                        return None
+                    continue  # синтаксис не поддерживается сервером - пробуем следующий
+                self._replica_status_query = (sql, column)
+                rows = cursor.fetchall()
+                if not rows:
+                    return 0
+                names = [d[0] for d in cursor.description]
+                lag = rows[0][names.index(column)]
+                return int(lag) if lag is not None else None
+        return None
+
+    @unknown_exception_catcher
+    @sll_exception_catcher
+    def execute_params(self, sql: str, args: any = None, get_lastrowid: bool = False, silence: bool = False) -> any:
+        """
+        Выполнение параметризованного запроса: значения связываются (экранируются) драйвером
+        :param sql: sql шаблон с параметрами %s (литеральный % пишется как %%)
+        :param args: []/tuple значений параметров
+        :param get_lastrowid: вернуть id последней вставленной записи
+        :param silence: печатаем ли отладочную информацию
+        :return:
+            * True, lastrowid - successful result.
+            * None - exceptions exists
+        """
+        with self._db_connection.cursor() as cursor:
+            return self._execute(cursor=cursor, sql=sql, get_lastrowid=get_lastrowid, silence=silence, args=args)
+
+    @unknown_exception_catcher
+    @sll_exception_catcher
+    def fetch_params(self, sql: str, args: any = None, silence: bool = False) -> (any, any):
+        """
+        Параметризованный запрос с получением ответа (аналог _execute_and_fetch_all)
+        :param sql: sql шаблон с параметрами %s (литеральный % пишется как %%)
+        :param args: []/tuple значений параметров
+        :param silence: печатаем ли отладочную информацию
+        :return:
+            * Obj<list>, int  - Result of cursor.fetchall()
+            * None, None - exceptions exists or errors
+        """
+        with self._db_connection.cursor() as cursor:
+            return self._execute_and_fetch_all(cursor=cursor, sql=sql, silence=silence, args=args)
+
     @unknown_exception_catcher
     def execute(self, sql: str, execute_many_data: any = None, get_lastrowid: bool = False, silence: bool = False,
-                mocking: bool = False) -> (bool, any):
+                mocking: bool = False, checkpoint_file: any = None, ignore_duplicates: bool = False) -> (bool, any):
         """
         Метод для осуществления SQL запроса, без возвращения данных из БД
         Служит для централизованного логирования всех запросов к БД и предоставляет возможности mocking-а запросов
-        Внутри есть встроенный "пагинатор" запросов
+        Внутри есть встроенный адаптивный "пагинатор" запросов: размер пачки executemany подбирается по оценке
+        размера строки (пачка - примерно один пакет max_allowed_packet) и по времени выполнения предыдущей пачки
+        (цель - EXECUTEMANY_TARGET_LATENCY). Статистика пачек последнего вызова - в self.executemany_stats.
+        При разрыве соединения пачка повторяется после переподключения (reconnect), смещение последней
+        выполненной пачки можно сохранять в файл, чтобы следующий запуск продолжил загрузку с него.
         :param sql: запрос к БД
-        :param execute_many_data: данные для запроса cursor.executemany
+        :param execute_many_data: данные для запроса cursor.executemany (список или любой итерируемый объект)
         :param get_lastrowid: вернуть id последней вставленной записи (работает только при execute_mny_data=None)
         :param silence: печатаем ли отладочную информацию
         :param mocking: объект для подмены БД
+        :param checkpoint_file: файл смещения (executemany): при старте строки до сохраненного смещения пропускаются,
+        после каждой закоммиченной пачки смещение обновляется, после успешного завершения файл удаляется.
+        Внутри transaction() не допускается (пачки коммитятся только в конце блока)
+        :param ignore_duplicates: повторно выполняемая пачка (после разрыва, после старта со смещения или при
+        ошибке дубликата ключа) выполняется как 'INSERT IGNORE' - уже вставленные строки пропускаются
         :return:
             * True, cursor (if flag cursor_return=True) - successful result.
             * None - exceptions exists
         """
         with self._db_connection.cursor() as cursor:
-            if execute_many_data:
-                offset = 0
-                limit = self.MAX_CNT_EXECUTEMANY_DATA \
-                    if len(execute_many_data) >= self.MAX_CNT_EXECUTEMANY_DATA else len(execute_many_data)
-                while offset < len(execute_many_data):
-                    end = offset + limit if len(execute_many_data) >= offset + limit else len(execute_many_data)
-                    if self._execute(cursor, sql, execute_many_data[offset:end], silence, mocking) is None:
-                        return None
-                    if self.fast_debug:
-                        break
-                    offset = end
-                CLogger.info(f"\tSuccessful processed {len(execute_many_data)} records!")
-                return True  # successful
+            if execute_many_data is not None and not (isinstance(execute_many_data, (list, tuple))
+                                                      and not execute_many_data):
+                return self._execute_many_adaptive(cursor, sql, execute_many_data, silence, mocking,
+                                                   checkpoint_file=checkpoint_file, ignore_duplicates=ignore_duplicates)
             else:
                 return self._execute(cursor=cursor, sql=sql, execute_many_data=None,
                                      get_lastrowid=get_lastrowid, silence=silence, mocking=mocking)
 
+    def _execute_many_adaptive(self, cursor: any, sql: str, execute_many_data: any, silence: bool = False,
+                               mocking: bool = False, checkpoint_file: any = None,
+                               ignore_duplicates: bool = False) -> any:
+        """
+        Выполнение executemany адаптивными пачками (без копирования входного списка, через islice)
+        :return:
+            * True - successful result.
+            * None - exceptions exists
+        """
+        if checkpoint_file and self._db_connection in self._transactions:
+            raise DbCriticalExceptionSLL(message=f"checkpoint_file can't be used inside transaction(): offset would be "
+                                                 f"saved before commit! {self.db_info()}", inst=None)
+        max_packet = self.get_max_allowed_packet() - self._max_allowed_packet_reserve if not mocking else None
+        if max_packet and max_packet > 0:
+            cursor.max_stmt_length = max_packet  # pymysql склеивает строки executemany до этой длины
+        rows = iter(execute_many_data)
+        chunk_size = self.MAX_CNT_EXECUTEMANY_DATA
+        max_chunk_size = self.LIMIT_CNT_EXECUTEMANY_DATA
+        row_size = None
+        offset = self._read_checkpoint(checkpoint_file, sql) if checkpoint_file else 0
+        if offset:
+            CLogger.info(f"\tResume from checkpoint {checkpoint_file}: skip {offset} records")
+            collections.deque(itertools.islice(rows, offset), maxlen=0)
+        replay = bool(offset)  # пачка после сохраненного смещения могла быть частично выполнена
+        stats = {"rows": 0, "seconds": 0.0, "row_size": None, "max_chunk_size": None, "offset": offset,
+                 "reconnects": 0, "batches": []}
+        self.executemany_stats = stats
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            if row_size is None:
+                row_size = self._estimate_row_size(chunk, mocking)
+                if max_packet and row_size:  # одна пачка ~ один пакет
+                    max_chunk_size = min(max(max_packet // row_size, 1), self.LIMIT_CNT_EXECUTEMANY_DATA)
+                stats["row_size"], stats["max_chunk_size"] = row_size, max_chunk_size
+                if len(chunk) > max_chunk_size:  # первая пачка не должна превышать пакет
+                    rows = itertools.chain(chunk[max_chunk_size:], rows)
+                    chunk = chunk[:max_chunk_size]
+            start_time = time.perf_counter()
+            if self._execute_chunk(cursor, sql, chunk, silence, mocking, stats, replay and ignore_duplicates,
+                                   ignore_duplicates) is None:
+                return None
+            replay = False
+            duration = time.perf_counter() - start_time
+            offset += len(chunk)
+            stats["offset"] = offset
+            if checkpoint_file:
+                self._write_checkpoint(checkpoint_file, sql, offset)
+            stats["rows"] += len(chunk)
+            stats["seconds"] += duration
+            stats["batches"].append({"rows": len(chunk), "seconds": duration,
+                                     "rows_per_sec": len(chunk) / duration if duration > 0 else None})
+            if self.fast_debug:
+                break
+            # рост/уменьшение не больше чем в 2 раза за пачку, в пределах [MIN_CNT_EXECUTEMANY_DATA, max_chunk_size]
+            factor = min(max(self.EXECUTEMANY_TARGET_LATENCY / duration, 0.5), 2) if duration > 0 else 2
+            chunk_size = min(max(int(len(chunk) * factor), self.MIN_CNT_EXECUTEMANY_DATA), max_chunk_size)
+        if checkpoint_file and not self.fast_debug and os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
+        CLogger.info(f"\tSuccessful processed {stats['rows']} records! Batches: {len(stats['batches'])}")
+        return True  # successful
+
+    def _execute_chunk(self, cursor: any, sql: str, chunk: list, silence: bool, mocking: bool, stats: dict,
+                       ignore: bool = False, ignore_duplicates: bool = False) -> any:
+        """
+        Одна пачка executemany с переподключением и повтором при разрыве соединения
+        (не внутри transaction() - после разрыва транзакция потеряна)
+        :param ignore: выполнить пачку как 'INSERT IGNORE'
+        :param ignore_duplicates: при разрыве или ошибке дубликата ключа повторять пачку как 'INSERT IGNORE'
+        :return:
+            * True - successful result.
+            * None - exceptions exists
+        """
+        cnt_reconnect = 0
+        while True:
+            try:
+                return self._execute_query(cursor=cursor, sql=self._insert_ignore_sql(sql) if ignore else sql,
+                                           execute_many_data=chunk, silence=silence, mocking=mocking)
+            except DbSqlQueryExceptionSLL as inst_query:
+                if self._is_connection_lost(inst_query.inst) and cnt_reconnect < self._max_cnt_reconnect and \
+                        self._db_connection not in self._transactions and not mocking:
+                    cnt_reconnect += 1
+                    stats["reconnects"] += 1
+                    CLogger.warning(f"Connection lost on executemany chunk (offset {stats['offset']}). Reconnect.")
+                    if self.reconnect():
+                        ignore = ignore_duplicates
+                        continue
+                elif ignore_duplicates and not ignore and self._is_duplicate_key(inst_query.inst):
+                    ignore = True
+                    continue
+                self._fail_transaction()
+                CLogger.exception(inst_query, f"\nDB SQL QUERY [SLL Exception] in method _execute_chunk")
+                return None
+
+    @staticmethod
+    def _insert_ignore_sql(sql: str) -> str:
+        return re.sub(r"^\s*INSERT\s+(?!IGNORE\b)", "INSERT IGNORE ", sql, count=1, flags=re.IGNORECASE)
+
+    @staticmethod
+    def _read_checkpoint(checkpoint_file: str, sql: str) -> int:
+        """
+        Смещение из файла checkpoint (0 - файла нет или он от другого запроса)
+        """
+        try:
+            with open(checkpoint_file) as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except Exception as inst:
+            CLogger.exception(inst, f"Can't read checkpoint {checkpoint_file}. Start from 0")
+            return 0
+        if checkpoint.get("sql") != hashlib.md5(sql.encode()).hexdigest():
+            CLogger.warning(f"Checkpoint {checkpoint_file} belongs to another query. Start from 0")
+            return 0
+        return int(checkpoint.get("offset", 0))
+
+    @staticmethod
+    def _write_checkpoint(checkpoint_file: str, sql: str, offset: int) -> None:
+        """
+        Атомарная запись смещения (временный файл + rename)
+        """
+        directory = os.path.dirname(os.path.abspath(checkpoint_file))
+        with tempfile.NamedTemporaryFile("w", dir=directory, delete=False) as f:
+            json.dump({"sql": hashlib.md5(sql.encode()).hexdigest(), "offset": offset}, f)
+        os.replace(f.name, checkpoint_file)
+
+    def _estimate_row_size(self, chunk: list, mocking: bool = False) -> int:
+        """
+        Оценка размера строки в запросе (байт): экранированные значения по выборке строк, с запасом 25%
+        :param chunk: []<tuple> - строки
+        :return: размер строки в байтах
+        """
+        sample = chunk[::max(len(chunk) // self.MAX_CNT_ROW_SIZE_SAMPLE, 1)]
+        try:
+            if mocking:
+                raise TypeError
+            escape = self._db_connection.escape
+            size = sum(len(escape(row)) for row in sample) / len(sample)
+        except Exception:  # строки-словари или подмена БД - грубая оценка
+            size = sum(len(str(row)) for row in sample) / len(sample)
+        return int(size * 1.25) + 1
+
     @unknown_exception_catcher
     def execute_and_fetch_all(self, sql: str, sql_template: any = None, callback: any = None, delete: bool = False,
-                              silence: bool = False, mocking: bool = False) -> (any, any):
+                              silence: bool = False, mocking: bool = False, keyset: any = None,
+                              keyset_where: any = None) -> (any, any):
         """
         Метод осуществления запроса к БД с получения ответа.
         Внимание! Если sql_template есть, то берется он, в противном случае берется sql.
@@ -161,6 +617,10 @@ class BaseMySQLDB:
         :param delete: флаг - используется ли функция для delete запроса (другие лимиты и ненмого логика другая)
         :param silence: печатаем ли отладочную информацию
         :param mocking: объект для подмены БД
+        :param keyset: колонка (или список колонок составного ключа) для keyset (seek) пагинации вместо LIMIT offset.
+        Ключ должен быть индексирован, UNIQUE и NOT NULL (иначе на границах страниц строки пропускаются или
+        повторяются) и присутствовать в выбираемых колонках, sql_template - без WHERE, ORDER BY и LIMIT
+        :param keyset_where: условие WHERE для keyset пагинации (передается отдельно от sql_template)
         :return:
             * Obj<list>, Cnt<int>  - Result of cursor.fetchall() or Result after callback func
             * None, None           - exceptions exists or errors
@@ -168,7 +628,14 @@ class BaseMySQLDB:
         result = []
         offset = 0
         with self._db_connection.cursor() as cursor:
-            if sql_template:
+            if sql_template and keyset and not delete:
+                result, offset = self._execute_and_fetch_all_keyset(cursor=cursor,
+                                                                    sql_template=sql_template,
+                                                                    keyset=keyset,
+                                                                    where=keyset_where,
+                                                                    silence=silence,
+                                                                    mocking=mocking)
+            elif sql_template:
                 limit = self.MAX_CNT_FETCH_ALL if not delete else self.MAX_CNT_DELETE_ROW
                 limit = limit if not self.fast_debug else self.MAX_CNT_FAST_DEBUG
                 while True:  # Получаем данные по частям, чтобы избежать переполнение буфера MySQL
@@ -205,10 +672,327 @@ class BaseMySQLDB:
                 raise DbCriticalExceptionSLL(f"Problem when call 'callback'! ", inst_callback)
         return result, offset
 
+    def iter_select(self, sql: str, batch_size: int = 0, silence: bool = False, mocking: bool = False) -> any:
+        """
+        Потоковое чтение результата запроса через небуферизированный серверный курсор (pymysql SSCursor).
+        Строки читаются из сокета по мере потребления, поэтому память ограничена размером пачки, а не таблицы.
+        Внимание! Пока генератор не исчерпан (или не закрыт), соединение занято и другие запросы через него
+        делать нельзя.
+        :param sql: запрос к БД
+        :param batch_size: 0 - отдавать по одной строке, > 0 - отдавать списки строк такого размера
+        :param silence: печатаем ли отладочную информацию
+        :param mocking: объект для подмены БД
+        :return: генератор строк (tuple) или пачек строк ([]<tuple>);
+        при ошибке запроса - исключение DbCriticalExceptionSLL (а не пустой результат)
+        """
+        limit = self.MAX_CNT_FAST_DEBUG if self.fast_debug else None
+        connection = self._db_connection
+        cursor = connection.cursor(pymysql.cursors.SSCursor)
+        finished = False
+        try:
+            if not self._execute(cursor=cursor, sql=sql, silence=silence, mocking=mocking):
+                finished = True  # результата нет - дочитывать нечего
+                raise DbCriticalExceptionSLL(message=f"Can't execute stream query! {self.db_info()}", inst=None)
+            cnt = 0
+            if batch_size:
+                while True:
+                    batch = cursor.fetchmany(batch_size if limit is None else min(batch_size, limit - cnt))
+                    if not batch:
+                        finished = True
+                        break
+                    cnt += len(batch)
+                    yield batch
+                    if limit is not None and cnt >= limit:
+                        break
+            else:
+                for row in cursor:
+                    cnt += 1
+                    yield row
+                    if limit is not None and cnt >= limit:
+                        break
+                else:
+                    finished = True
+        finally:
+            self._close_stream(connection, cursor, finished)
+
+    def _close_stream(self, connection: any, cursor: any, finished: bool) -> None:
+        """
+        Закрыть небуферизированный курсор (SSCursor). SSCursor.close() дочитывает остаток результата с сервера,
+        поэтому прерванное чтение (лимит fast_debug, ошибка callback, закрытие генератора) не дочитывается:
+        соединение закрывается и открывается заново. Внутри transaction() остаток дочитывается - разрыв
+        соединения потерял бы незакоммиченную транзакцию.
+        :param connection: соединение курсора
+        :param cursor: SSCursor
+        :param finished: результат прочитан до конца
+        """
+        if connection.open and (finished or connection in self._transactions):
+            cursor.close()
+            return
+        reopen = connection.open
+        if reopen:
+            connection.close()
+        connection._result = None  # иначе pymysql дочитывал бы старый результат из нового сокета
+        if not reopen:
+            return  # соединение разорвано - восстановится при следующем запросе (reconnect)
+        try:
+            connection.connect()
+            if self.charset:
+                self.set_charset(self.charset)
+        except Exception as inst:
+            CLogger.exception(inst, f"[STREAM] Can't reopen connection after interrupted read: {self.db_info()}")
+
+    @unknown_exception_catcher
+    def stream_query(self, sql: str, callback: any, batch_size: int = None, silence: bool = False,
+                     mocking: bool = False, workers: int = 0) -> any:
+        """
+        Потоковая обработка результата запроса: callback вызывается на каждую пачку строк по мере их получения
+        :param sql: запрос к БД
+        :param callback: функция колбэк, принимает []<tuple> - очередную пачку строк
+        :param batch_size: размер пачки (по умолчанию MAX_CNT_STREAM_BATCH)
+        :param silence: печатаем ли отладочную информацию
+        :param mocking: объект для подмены БД
+        :param workers: > 0 - callback выполняется в пуле потоков, пока текущий поток читает следующие пачки
+        (в обработке не больше 2 * workers пачек, память ограничена). Порядок вызовов callback не гарантирован
+        при workers > 1. Внимание! Соединение занято чтением, callback не должен делать запросы через этот объект
+        без worker_connection.
+        :return:
+            * Cnt<int> - кол-во обработанных строк
+            * None     - unknown exceptions (ошибка запроса или callback - исключение DbCriticalExceptionSLL)
+        """
+        cnt = 0
+        batches = self.iter_select(sql=sql, batch_size=batch_size if batch_size else self.MAX_CNT_STREAM_BATCH,
+                                   silence=silence, mocking=mocking)
+        if workers > 0:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                in_flight = collections.deque()
+                try:
+                    for batch in batches:
+                        if len(in_flight) >= 2 * workers:
+                            cnt += self._stream_callback_result(in_flight.popleft())
+                        in_flight.append(executor.submit(lambda b: (callback(b), len(b))[1], batch))
+                    while in_flight:
+                        cnt += self._stream_callback_result(in_flight.popleft())
+                finally:
+                    for future in in_flight:
+                        future.cancel()
+                    batches.close()
+            return cnt
+        with contextlib.closing(batches):  # при ошибке callback чтение прерывается сразу (см. _close_stream)
+            for batch in batches:
+                try:
+                    callback(batch)
+                except Exception as inst_callback:
+                    raise DbCriticalExceptionSLL(f"Problem when call 'callback'! ", inst_callback)
+                cnt += len(batch)
+        return cnt
+
+    @unknown_exception_catcher
+    def fetch_columns(self, sql: str, batch_size: int = None, silence: bool = False, mocking: bool = False) -> any:
+        """
+        Результат запроса по колонкам: строки читаются потоково (SSCursor) пачками и сразу раскладываются
+        в типизированные колонки по cursor.description (ResultColumns), список tuple не создается
+        :param sql: запрос к БД
+        :param batch_size: размер пачки (по умолчанию MAX_CNT_STREAM_BATCH)
+        :param silence: печатаем ли отладочную информацию
+        :param mocking: объект для подмены БД
+        :return:
+            * ResultColumns - колонки (numpy массивы через [] / to_numpy(), Arrow - to_arrow())
+            * None          - exceptions exists or errors
+        """
+        batch_size = batch_size if batch_size else self.MAX_CNT_STREAM_BATCH
+        limit = self.MAX_CNT_FAST_DEBUG if self.fast_debug else None
+        connection = self._db_connection
+        cursor = connection.cursor(pymysql.cursors.SSCursor)
+        finished = False
+        try:
+            if not self._execute(cursor=cursor, sql=sql, silence=silence, mocking=mocking):
+                finished = True
+                return None
+            columns = ResultColumns(cursor.description, unsigned=self._unsigned_columns(cursor))
+            while limit is None or len(columns) < limit:
+                batch = cursor.fetchmany(batch_size if limit is None else min(batch_size, limit - len(columns)))
+                if not batch:
+                    finished = True
+                    break
+                columns.extend(batch)
+        finally:
+            self._close_stream(connection, cursor, finished)
+        return columns
+
+    @staticmethod
+    def _result_fields(cursor: any) -> list:
+        """
+        Поля результата pymysql (флаги и кодировка колонок, в cursor.description их нет)
+        :param cursor: курсор после execute
+        :return: [] полей в порядке cursor.description (None - поле недоступно, например при mocking)
+        """
+        fields = getattr(getattr(cursor, "_result", None), "fields", None)
+        return list(fields) if fields else [None] * len(cursor.description or ())
+
+    def _unsigned_columns(self, cursor: any) -> list:
+        """
+        Признаки UNSIGNED колонок результата
+        :param cursor: курсор после execute
+        :return: [] bool в порядке cursor.description
+        """
+        return [f is not None and bool(f.flags & FLAG.UNSIGNED) for f in self._result_fields(cursor)]
+
+    def _export_types(self, cursor: any) -> list:
+        """
+        Типы колонок выгрузки (ResultExporter) по cursor.description и полям результата, а не по данным:
+        UNSIGNED целые - 'uint', DECIMAL(M, D) - ('decimal', M, D), BLOB/BINARY - 'binary', TEXT/CHAR - 'string'
+        :param cursor: курсор после execute
+        :return: [] типов в порядке cursor.description
+        """
+        types = []
+        for d, field in zip(cursor.description, self._result_fields(cursor)):
+            unsigned = field is not None and bool(field.flags & FLAG.UNSIGNED)
+            if d[1] in ResultColumns.INT_TYPES:
+                types.append("uint" if unsigned else "int")
+            elif d[1] in (FIELD_TYPE.DECIMAL, FIELD_TYPE.NEWDECIMAL):
+                # длина DECIMAL(M, D) = M + десятичная точка (D > 0) + знак (не UNSIGNED)
+                precision = d[4] - (1 if d[5] else 0) - (1 if field is not None and not unsigned else 0)
+                types.append(("decimal", max(precision, d[5], 1), d[5]))
+            elif d[1] in self.EXPORT_TEXT_TYPES:
+                types.append(None if field is None else "binary" if field.charsetnr == self.BINARY_CHARSET else
+                             "string")
+            else:
+                types.append(self.EXPORT_TYPES.get(d[1]))
+        return types
+
+    @unknown_exception_catcher
+    def export_query(self, path: str, sql: str = None, sql_template: str = None, fmt: str = None,
+                     compression: str = None, batch_size: int = None, row_group_size: int = None,
+                     silence: bool = False, mocking: bool = False) -> any:
+        """
+        Потоковая выгрузка результата запроса в файл CSV или Parquet (ResultExporter): строки читаются
+        небуферизированным курсором (SSCursor) пачками и сразу пишутся в файл, память ограничена пачкой/row group.
+        Внимание! Если sql_template есть, то берется он (целиком, без LIMIT), в противном случае берется sql.
+        :param path: путь к файлу (.csv, .csv.gz, .csv.bz2, .csv.xz, .parquet)
+        :param sql: готовый sql запрос
+        :param sql_template: шаблон запроса к БД (как в execute_and_fetch_all)
+        :param fmt: 'csv' или 'parquet' (None - по расширению файла)
+        :param compression: сжатие (CSV - 'gzip', 'bz2', 'xz'; Parquet - 'snappy', 'zstd', ...)
+        :param batch_size: размер пачки чтения (по умолчанию MAX_CNT_STREAM_BATCH)
+        :param row_group_size: кол-во строк в row group Parquet
+        :param silence: печатаем ли отладочную информацию
+        :param mocking: объект для подмены БД
+        :return:
+            * {} - статистика выгрузки (rows, bytes, duration, rows_per_sec, bytes_per_sec, ...)
+            * None - exceptions exists or errors
+        """
+        sql = f"{sql_template.rstrip().rstrip(';')};" if sql_template else sql
+        batch_size = batch_size if batch_size else self.MAX_CNT_STREAM_BATCH
+        limit = self.MAX_CNT_FAST_DEBUG if self.fast_debug else None
+        connection = self._db_connection
+        cursor = connection.cursor(pymysql.cursors.SSCursor)
+        finished = False
+        try:
+            if not self._execute(cursor=cursor, sql=sql, silence=silence, mocking=mocking) or not cursor.description:
+                finished = True
+                return None
+            exporter = ResultExporter(path, names=[d[0] for d in cursor.description], types=self._export_types(cursor),
+                                      fmt=fmt, compression=compression, row_group_size=row_group_size)
+            with exporter:
+                while limit is None or exporter.cnt_rows < limit:
+                    batch = cursor.fetchmany(batch_size if limit is None else
+                                             min(batch_size, limit - exporter.cnt_rows))
+                    if not batch:
+                        finished = True
+                        break
+                    exporter.write(batch)
+        finally:
+            self._close_stream(connection, cursor, finished)
+        return exporter.log_stats()
+
+    @staticmethod
+    def _stream_callback_result(future: any) -> int:
+        try:
+            return future.result()
+        except Exception as inst_callback:
+            raise DbCriticalExceptionSLL(f"Problem when call 'callback'! ", inst_callback)
+
+    def _execute_and_fetch_all_keyset(self, cursor: any, sql_template: str, keyset: any, where: any = None,
+                                      silence: bool = False, mocking: bool = False) -> (any, any):
+        """
+        Постраничное получение данных keyset (seek) пагинацией: каждая следующая страница берется условием
+        'WHERE key > last_seen ORDER BY key LIMIT n', поэтому стоимость страницы не зависит от глубины чтения.
+        Для составного ключа (k1, k2) условие раскрывается в 'k1 > v1 OR (k1 = v1 AND k2 > v2)'.
+        Внимание! Ключ должен быть UNIQUE и NOT NULL, иначе на границах страниц строки пропускаются или повторяются.
+        :param cursor: текущее соединение с БД
+        :param sql_template: шаблон запроса к БД без WHERE, ORDER BY и LIMIT (подзапросы допускаются)
+        :param keyset: колонка или список колонок ключа
+        :param where: условие WHERE (без слова WHERE)
+        :param silence: печатаем ли отладочную информацию
+        :param mocking: объект для подмены БД
+        :return:
+            * Obj<list>, int - все полученные строки и их кол-во
+            * None, 0        - данных нет
+            * None, None     - exceptions exists or errors (частично полученные строки не возвращаются)
+        """
+        key_columns = [keyset] if isinstance(keyset, str) else list(keyset)
+        limit = self.MAX_CNT_FETCH_ALL if not self.fast_debug else self.MAX_CNT_FAST_DEBUG
+        order_by = ",".join(key_columns)
+        key_index = None
+        last_key = None
+        result = []
+        while True:
+            conditions = [f"({where})"] if where else []
+            if last_key is not None:
+                conditions.append(f"({self._keyset_condition(key_columns, last_key)})")
+            condition = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+            sql = f"{sql_template}{condition} ORDER BY {order_by} LIMIT {limit};"
+            r, cnt_received = self._execute_and_fetch_all(cursor=cursor,
+                                                          sql=sql,
+                                                          execute_many_data=None,
+                                                          silence=silence,
+                                                          mocking=mocking)
+            if cnt_received is None:  # ошибка запроса - не отдаем обрезанный результат
+                return None, None
+            if not r:
+                break
+            result.extend(r)
+            if key_index is None:
+                key_index = self._keyset_index(cursor, key_columns)
+            last_key = [r[-1][i] for i in key_index]
+            # Условия выхода (получено меньше чем limit или быстрая отладка)
+            if cnt_received < limit or self.fast_debug:
+                break
+        return result if result else None, len(result)
+
+    def _keyset_condition(self, key_columns: list, last_key: list) -> str:
+        """
+        Условие 'ключ > последнего прочитанного' для keyset пагинации
+        :param key_columns: колонки ключа
+        :param last_key: значения ключа последней полученной строки
+        :return: sql условие
+        """
+        values = [self._db_connection.escape(v) for v in last_key]
+        conditions = []
+        for i, column in enumerate(key_columns):
+            equals = [f"{key_columns[j]} = {values[j]}" for j in range(i)]
+            conditions.append(" AND ".join(equals + [f"{column} > {values[i]}"]))
+        return " OR ".join(f"({c})" for c in conditions) if len(conditions) > 1 else conditions[0]
+
+    @staticmethod
+    def _keyset_index(cursor: any, key_columns: list) -> list:
+        """
+        Позиции колонок ключа в строках результата (по cursor.description)
+        :param cursor: курсор выполненного запроса
+        :param key_columns: колонки ключа (допускаются `table`.`column`)
+        :return: [] индексов
+        """
+        names = [d[0].lower() for d in cursor.description]
+        try:
+            return [names.index(c.split(".")[-1].strip("`").lower()) for c in key_columns]
+        except ValueError as inst:
+            raise DbCriticalExceptionSLL(message=f"Keyset columns {key_columns} must be selected! Columns: {names}",
+                                         inst=inst)
+
     @sll_exception_catcher
     @timer
     def _execute(self, cursor: any, sql: str, execute_many_data: any = None, get_lastrowid: bool = False,
-                 silence: bool = False, mocking: bool = False) -> any:
+                 silence: bool = False, mocking: bool = False, args: any = None) -> any:
         """
         Базовый метод для осуществления SQL запроса.
         Служит для централизованного логирования всех запросов к БД и предоставляет возможности mocking-а запросов
@@ -218,38 +1002,91 @@ class BaseMySQLDB:
         :param get_lastrowid: получить id последней всталвенной записи
         :param silence: печатаем ли отладочную информацию
         :param mocking: объект для подмены БД
+        :param args: параметры запроса cursor.execute (sql - шаблон с %s)
         :return:
             * True - successful result.
             * None - exceptions exists
         """
 
+        try:
+            return self._execute_query(cursor=cursor, sql=sql, execute_many_data=execute_many_data,
+                                       get_lastrowid=get_lastrowid, silence=silence, mocking=mocking, args=args)
+        except DbSqlQueryExceptionSLL:
+            self._local.cnt_query_errors = self.cnt_query_errors + 1
+            self._fail_transaction()
+            raise
+
+    @property
+    def cnt_query_errors(self) -> int:
+        """
+        Кол-во запросов, завершившихся ошибкой в текущем потоке (ошибки гасятся в _execute, методы возвращают None)
+        """
+        return getattr(self._local, "cnt_query_errors", 0)
+
+    def _fail_transaction(self) -> None:
+        """
+        Пометить открытую transaction() текущего соединения ошибочной (в конце блока будет rollback)
+        """
+        tx = self._transactions.get(self._db_connection)
+        if tx is not None:
+            tx.failed = True
+
+    def _execute_query(self, cursor: any, sql: str, execute_many_data: any = None, get_lastrowid: bool = False,
+                       silence: bool = False, mocking: bool = False, args: any = None) -> any:
+        """
+        Тело _execute без обработки исключений: DbSqlQueryExceptionSLL пробрасывается (для повторов запроса)
+        """
         cursor = MockingHelper().get_cursor() if mocking else cursor
         if cursor:
+            start_time = time.perf_counter() if Metrics.enabled else None
             try:
-                if not silence:
-                    CLogger.printc(f"\tExecute sql query:\n"
-                                   f"\t\t{Color.Light_Cyan}{sql}", color=Color.Yellow)
-                if execute_many_data:
-                    CLogger.printc(f"\tSQL data args:\n"
-                                   f"\t\t{Color.Light_Magenta}{execute_many_data[:self.MAX_CNT_VIEW_LOG_DATA]}",
-                                   color=Color.Yellow)
-                cursor.execute(sql) if execute_many_data is None else cursor.executemany(sql, execute_many_data)
-                if not self.autocommit:
-                    self._db_connection.commit()  # if autocommit true; doesn't need
+                if not silence and QLogger.is_enabled():
+                    QLogger.log(sql, execute_many_data if execute_many_data is not None else args,
+                                many=execute_many_data is not None, db_info=self.db_info())
+                if execute_many_data is not None:
+                    cursor.executemany(sql, execute_many_data)
+                else:
+                    cursor.execute(sql) if args is None else cursor.execute(sql, args)
+                if start_time is not None:
+                    self._record_metrics(sql, start_time, cursor, execute_many_data, args)
+                self._after_execute(sql, execute_many_data, args)
                 return True if not get_lastrowid else True, cursor.lastrowid  # successful
             except Exception as inst:
+                if start_time is not None:
+                    self._record_metrics(sql, start_time, None, execute_many_data, args, error=True)
                 raise DbSqlQueryExceptionSLL(
                     db_info=self.db_info(),
                     sql=sql,
-                    sql_args_data=execute_many_data,
+                    sql_args_data=execute_many_data if execute_many_data is not None else args,
                     message=f"Error in func {other.who_am_i()!r}\n",
                     inst=inst)
         else:
             raise DbCriticalExceptionSLL(message=f"Cursor obj is None!", inst=None)
 
+    def _record_metrics(self, sql: str, start_time: float, cursor: any, execute_many_data: any = None,
+                        args: any = None, error: bool = False) -> None:
+        """
+        Учесть запрос в реестре метрик (Metrics): время, затронутые/полученные строки, оценка отправленных байт
+        """
+        rows = getattr(cursor, "rowcount", 0) if cursor is not None else 0
+        rows = rows if isinstance(rows, int) and 0 <= rows < 2 ** 63 else 0  # SSCursor: кол-во строк еще неизвестно
+        Metrics.record("mysql", sql, time.perf_counter() - start_time, rows=rows,
+                       bytes_sent=self._estimate_bytes_sent(sql, execute_many_data, args), error=error)
+
+    def _estimate_bytes_sent(self, sql: str, execute_many_data: any = None, args: any = None) -> int:
+        """
+        Оценка размера запроса в байтах (sql + данные)
+        """
+        bytes_sent = len(sql)
+        if execute_many_data:
+            bytes_sent += len(execute_many_data) * self._estimate_row_size(execute_many_data)
+        elif args:
+            bytes_sent += sum(len(str(a)) for a in (args.values() if isinstance(args, dict) else args))
+        return bytes_sent
+
     @sll_exception_catcher
     def _execute_and_fetch_all(self, cursor: any, sql: str, execute_many_data: any = None, silence: bool = False,
-                               mocking: bool = False) -> (any, any):
+                               mocking: bool = False, args: any = None) -> (any, any):
         """
         Базовый метод осуществления запроса к БД с получения ответа.
         :param cursor: текущее соединение с БД
@@ -257,64 +1094,170 @@ class BaseMySQLDB:
         :param execute_many_data: данные для запроса cursor.executemany
         :param silence: печатаем ли отладочную информацию
         :param mocking: объект для подмены БД
+        :param args: параметры запроса cursor.execute (sql - шаблон с %s)
         :return: result and received rowcount
             * Obj<list>, int  - Result of cursor.fetchall()
             * None, None - exceptions exists or errors
         """
         try:
-            if self._execute(cursor, sql, execute_many_data, silence, mocking):
-                result = []
-                for r in cursor.fetchall():
-                    result.append(r)
-                return result if len(result) else None, cursor.rowcount
+            if self._execute(cursor, sql, execute_many_data, silence=silence, mocking=mocking, args=args):
+                result = list(cursor.fetchall())
+                return result if result else None, cursor.rowcount
             else:
                 return None, None
         except Exception as inst:
             raise DbCriticalExceptionSLL(message=f"Unknown Error!", inst=inst)
 
 
+_TSV_ESCAPE = {ord("\\"): b"\\\\", ord("\t"): b"\\t", ord("\n"): b"\\n", ord("\r"): b"\\r", 0: b"\\0"}
+_RE_TSV_ESCAPE = re.compile(rb"[\\\t\n\r\0]")
+
+
+def _tsv_value(value: any) -> bytes:
+    """
+    Значение поля для файла LOAD DATA INFILE
+    :param value: значение python (bytes - двоичные данные, пишутся как есть с экранированием)
+    :return: экранированное значение в utf8
+    """
+    if value is None:
+        return b"\\N"
+    if isinstance(value, bool):
+        return b"1" if value else b"0"
+    if isinstance(value, (int, float)):
+        return str(value).encode()
+    if isinstance(value, (bytes, bytearray)):
+        value = bytes(value)
+    elif isinstance(value, datetime.datetime):
+        value = value.isoformat(sep=" ").encode()
+    else:
+        value = str(value).encode("utf-8")
+    return _RE_TSV_ESCAPE.sub(lambda m: _TSV_ESCAPE[m.group()[0]], value)
+
+
 class LogDB(BaseMySQLDB):
     """
     Класс для работы с БД Логов модуля (Бони, 365 дневных таблиц)
     """
 
+    MAX_CNT_DECODE_CHUNK = 50000  # Кол-во строк в пачке для параллельного разбора логов в пуле процессов
+
     def __init__(self,
                  db_config,
                  type_log,
                  date=None,
                  autocommit=True,
                  fast_debug=False,
+                 pool=None,
+                 decoder=None,
                  ):
-        BaseMySQLDB.__init__(self, db_config=db_config, auto_commit=autocommit, fast_debug=fast_debug)
+        BaseMySQLDB.__init__(self, db_config=db_config, auto_commit=autocommit, fast_debug=fast_debug, pool=pool)
+        self.decoder = decoder  # LogDecoder для быстрого разбора строк лога (None - process_log_data)
         self.type_log = type_log  # Тип лога
         self.date = date if date else datetime.datetime.now()  # если не задано берем - текущюю датау
         self.day = self.date.timetuple().tm_yday - 1  # номер таблицы лога - день в году минус 1
 
+    @staticmethod
+    def day_of_date(date: datetime.datetime) -> int:
+        """
+        Номер дневной таблицы лога для даты: log_{N}, N - день в году минус 1
+        :param date: дата
+        :return: номер таблицы
+        """
+        return date.timetuple().tm_yday - 1
+
     @timer
-    def get_count_table(self, where=None):
+    def get_count_table(self, where=None, day=None):
         """
         Метод для получения кол-ва записей определенного типа в лог таблице
         'SELECT COUNT(1) FROM log_{self.day} WHERE type={self.type_log} AND {where} LIMIT 1;'
         :param where: дополнительно AND условие в запросе
+        :param day: номер таблицы лога (по умолчанию self.day)
         :return: число записей в таблице
         """
-        CLogger.info(f'Try Select COUNT(1) for table log_{self.day}')
-        sql = f"SELECT COUNT(1) FROM log_{self.day} WHERE type={self.type_log} AND {where} LIMIT 1;" \
+        day = self.day if day is None else day
+        CLogger.info(f'Try Select COUNT(1) for table log_{day}')
+        sql = f"SELECT COUNT(1) FROM log_{day} WHERE type=%s AND {where.replace('%', '%%')} LIMIT 1;" \
             if where else \
-            f"SELECT COUNT(1) FROM log_{self.day} WHERE type={self.type_log} LIMIT 1;"
-        r = self.execute_and_fetch_all(sql=sql, callback=lambda x: x[0][0])[0]
-        return r if r else None
+            f"SELECT COUNT(1) FROM log_{day} WHERE type=%s LIMIT 1;"
+        r = self.fetch_params(sql, (self.type_log,))
+        return r[0][0][0] if r and r[0] else None
+
+    @staticmethod
+    def convert_mas_to_dict(arr):
+        """
+        Функция конвертер массива словарей в словарь массивов
+        :param arr: [] массив словарей
+        :return: {} словарь массивов (ключи crc - пользователей)
+        """
+        a = None
+        try:
+            dd = {}
+            for a in arr:
+                if a['crc'] not in dd.keys():
+                    dd[a['crc']] = []
+                dd[a['crc']].append(a)
+            return dd
+        except Exception as inst:
+            CLogger.exception(inst, f"Problem in func: {other.who_am_i()!r}.\n Data:{a}")
+
+    @staticmethod
+    def process_log_data(records):
+        """
+        Предобработка данных логов из БД log
+        :param records: [] tuple
+        :return: [] of {}
+        """
+        result = []
+        r = None
+        try:
+            for r in records:
+                d = json.loads(r[3])
+                if "crc" not in d.keys():
+                    continue
+                d["time"] = int(datetime.datetime.strptime(d["time"], "%Y-%m-%d %H:%M:%S").timestamp())
+                result.append(d)
+            return result
+        except Exception as inst_parse_log_data:
+            raise DbCriticalExceptionSLL(message=f"Error in func {other.who_am_i()!r}. While parse log data {r}",
+                                         inst=inst_parse_log_data)
+
+    def decode_log_data(self, records):
+        """
+        Разбор строк лога выбранным декодером (self.decoder или process_log_data)
+        :param records: [] tuple
+        :return: [] of {}
+        """
+        return self.decoder.decode(records) if self.decoder else self.process_log_data(records)
+
+    def _log_where(self, where=None, ignore_zero_crc=True):
+        """
+        Итоговое AND условие запроса к log таблице (с учетом ignore_zero_crc)
+        """
+        return f"{where}{' AND crc!=0' if ignore_zero_crc else ''}" if where else "crc!=0" if ignore_zero_crc else None
+
+    def _log_select_sql(self, day, where=None):
+        """
+        SELECT запрос к дневной таблице лога без ORDER BY и LIMIT
+        """
+        return f"SELECT * FROM log_{day} WHERE type={self.type_log} AND {where}" \
+            if where else f"SELECT * FROM log_{day} WHERE type={self.type_log}"
 
     @timer
-    def get_log_data(self, where=None, order_by=None, group_by_crc=True, ignore_zero_crc=True):
+    def get_log_data(self, where=None, order_by=None, group_by_crc=True, ignore_zero_crc=True, day=None, workers=0,
+                     chunk_size=None, columnar=False):
         """
         Базовая функция получения данных из log таблицы
         :param where: дополнительно AND условие в запросе
         :param order_by: сортировка
         :param group_by_crc:
         :param ignore_zero_crc:
+        :param day: номер таблицы лога (по умолчанию self.day)
+        :param workers: > 0 - разбор строк в пуле из workers процессов (строки читаются потоком пачками)
+        :param chunk_size: кол-во строк в пачке для процесса (по умолчанию MAX_CNT_DECODE_CHUNK)
+        :param columnar: вернуть компактный LogColumns вместо {} (строки читаются потоком, группировка по crc)
         :return:
             * {} or [] (group: TRUE ? FALSE) - successful
+            * LogColumns - columnar=True
             * None - fail
         """
 
@@ -322,66 +1265,137 @@ class LogDB(BaseMySQLDB):
         #   * [] массив словарей (нет группировки group_by_crc=FALSE)
         #   * {} словарь массивов (есть группировка group_by_crc=TRUE), где ключи - crc пользователей
 
-        def convert_mas_to_dict(arr):
-            """
-            Функция конвертер массива словарей в словарь массивов
-            :param arr: [] массив словарей
-            :return: {} словарь массивов (ключи crc - пользователей)
-            """
-            a = None
-            try:
-                dd = {}
-                for a in arr:
-                    if a['crc'] not in dd.keys():
-                        dd[a['crc']] = []
-                    dd[a['crc']].append(a)
-                return dd
-            except Exception as inst:
-                CLogger.exception(inst, f"Problem in func: {other.who_am_i()!r}.\n Data:{a}")
-
-        def process_log_data(records):
-            """
-            Предобработка данных логов из БД log
-            :param records: [] tuple
-            :return: [] of {}
-            """
-            result = []
-            r = None
-            try:
-                for r in records:
-                    d = json.loads(r[3])
-                    if "crc" not in d.keys():
-                        continue
-                    d["time"] = int(datetime.datetime.strptime(d["time"], "%Y-%m-%d %H:%M:%S").timestamp())
-                    result.append(d)
-                return result
-            except Exception as inst_parse_log_data:
-                raise DbCriticalExceptionSLL(message=f"Error in func {other.who_am_i()!r}. While parse log data {r}",
-                                             inst=inst_parse_log_data)
-
+        day = self.day if day is None else day
         order_by = f"ORDER BY {order_by}" if order_by else ""
-        where = f"{where}{' AND crc!=0' if ignore_zero_crc else ''}" if where else "crc!=0" if ignore_zero_crc else None
+        where = self._log_where(where, ignore_zero_crc)
 
-        sql_template = f"SELECT * FROM log_{self.day} WHERE type={self.type_log} AND {where} {order_by}" \
-            if where else f"SELECT * FROM log_{self.day} WHERE type={self.type_log} {order_by}"
-        CLogger.info(f"Estimated cnt record for this select query: {self.get_count_table(where=where)}")
-        CLogger.info(f"{Color.Light_Blue}SELECT{CLogger.infoColor} data from {Color.Magenta}log_{self.day} "
+        sql_template = f"{self._log_select_sql(day, where)} {order_by}"
+        CLogger.info(f"Estimated cnt record for this select query: {self.get_count_table(where=where, day=day)}")
+        CLogger.info(f"{Color.Light_Blue}SELECT{CLogger.infoColor} data from {Color.Magenta}log_{day} "
                      f"{Color.Blue}{self.db_info()}")
-        log_data = self.execute_and_fetch_all(sql=None, sql_template=sql_template, callback=process_log_data)[0]  # ![0]
-        return convert_mas_to_dict(log_data) if group_by_crc else log_data if log_data else None
+        if columnar:
+            log_data = LogColumns(self.decoder.fields if self.decoder and self.decoder.fields else None)
+            if workers:
+                self._decode_log_data_parallel(f"{sql_template};", workers, chunk_size, merge=log_data.extend)
+            else:
+                self.stream_query(sql=f"{sql_template};", batch_size=chunk_size,
+                                  callback=lambda batch: log_data.extend(self.decode_log_data(batch)))
+            return log_data.freeze()
+        if workers:
+            if group_by_crc:
+                log_data = {}
+                self._decode_log_data_parallel(f"{sql_template};", workers, chunk_size,
+                                               merge=lambda arr: self._merge_to_dict(log_data, arr))
+                return log_data
+            log_data = []
+            self._decode_log_data_parallel(f"{sql_template};", workers, chunk_size, merge=log_data.extend)
+            return log_data if log_data else None
+        log_data = self.execute_and_fetch_all(sql=None, sql_template=sql_template,
+                                              callback=self.decode_log_data)[0]  # ![0]
+        return self.convert_mas_to_dict(log_data) if group_by_crc else log_data if log_data else None
+
+    def _decode_log_data_parallel(self, sql, workers, chunk_size=None, merge=None):
+        """
+        Потоковое чтение строк лога пачками и их разбор в пуле процессов.
+        Пока процессы разбирают пачки, следующие пачки уже читаются из БД; в работе не больше 2*workers пачек,
+        результаты передаются в merge по порядку пачек.
+        :param sql: запрос к log таблице
+        :param workers: кол-во процессов
+        :param chunk_size: кол-во строк в пачке
+        :param merge: функция, принимающая [] of {} - разобранную пачку
+        :return: None
+        """
+        decode = self.decoder.decode if self.decoder else LogDB.process_log_data
+        pending = collections.deque()
+        batches = self.iter_select(sql=sql, batch_size=chunk_size if chunk_size else self.MAX_CNT_DECODE_CHUNK)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor, contextlib.closing(batches):
+            for batch in batches:
+                pending.append(executor.submit(decode, batch))
+                if len(pending) >= 2 * workers:
+                    merge(pending.popleft().result())
+            while pending:
+                merge(pending.popleft().result())
+
+    @staticmethod
+    def _merge_to_dict(dd, arr):
+        """
+        Дописать массив словарей в словарь массивов (ключи crc - пользователей)
+        """
+        for a in arr:
+            dd.setdefault(a["crc"], []).append(a)
+
+    @timer
+    def get_log_range(self, date_from, date_to, where=None, order_by=None, group_by_crc=True, ignore_zero_crc=True,
+                      sort_by_time=False, union_all=False, max_workers=None):
+        """
+        Получить данные за произвольный интервал [date_from, date_to), в т.ч. через несколько дневных таблиц log_N.
+        Каждая таблица читается в отдельном потоке по своему соединению (worker_connection), либо все таблицы
+        одним потоковым запросом 'UNION ALL' (union_all=True, дешевле для коротких интервалов через полночь).
+        :param date_from: начало интервала (включительно)
+        :param date_to: конец интервала (не включительно)
+        :param where: дополнительное условие поиска
+        :param order_by: сортировка внутри каждой таблицы (игнорируется при sort_by_time)
+        :param group_by_crc: группировать по пользователям
+        :param ignore_zero_crc: игнорировать crc==0
+        :param sort_by_time: вернуть события упорядоченными по времени (k-way merge отсортированных таблиц)
+        :param union_all: один запрос UNION ALL вместо параллельных запросов по таблицам
+        :param max_workers: кол-во потоков (по умолчанию - по числу таблиц)
+        :return:
+            * {} or [] (group: TRUE ? FALSE) - successful
+            * None - fail
+        """
+        days = []
+        date = datetime.datetime.combine(date_from.date(), datetime.time())
+        while date < date_to:
+            days.append(self.day_of_date(date))
+            date += datetime.timedelta(days=1)
+        if len(days) != len(set(days)):
+            raise DbCriticalExceptionSLL(message=f"Interval [{date_from}, {date_to}) is longer than a year! "
+                                                 f"Log tables log_N are cyclic.", inst=None)
+        condition = f"time >= '{date_from.strftime('%Y-%m-%d %H:%M:%S')}' " \
+            f"AND time < '{date_to.strftime('%Y-%m-%d %H:%M:%S')}'"
+        condition = f"{where} AND {condition}" if where else condition
+        order_by = "time" if sort_by_time else order_by
+        CLogger.info(f"{Color.Light_Blue}SELECT{CLogger.infoColor} data [{date_from}, {date_to}) from "
+                     f"{Color.Magenta}{', '.join(f'log_{d}' for d in days)} {Color.Blue}{self.db_info()}")
+
+        if not days:
+            log_data = []
+        elif len(days) == 1:
+            log_data = self.get_log_data(condition, order_by, False, ignore_zero_crc, day=days[0]) or []
+        elif union_all:
+            condition = self._log_where(condition, ignore_zero_crc)
+            sql = " UNION ALL ".join(f"({self._log_select_sql(d, condition)})" for d in days)
+            sql = f"{sql} ORDER BY {order_by};" if order_by else f"{sql};"
+            log_data = []
+            self.stream_query(sql=sql, callback=lambda batch: log_data.extend(self.decode_log_data(batch)))
+        else:
+            def get_log_day(day):
+                with self.worker_connection():
+                    return self.get_log_data(condition, order_by, False, ignore_zero_crc, day=day) or []
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or len(days)) as executor:
+                parts = list(executor.map(get_log_day, days))
+            log_data = list(heapq.merge(*parts, key=lambda d: d["time"])) if sort_by_time else \
+                list(itertools.chain.from_iterable(parts))
+        return self.convert_mas_to_dict(log_data) if group_by_crc else log_data if log_data else None
 
     def get_log_last_x_min(self, x, where=None, order_by=None, group_by_crc=True, ignore_zero_crc=True):
         """
-        ВНИМАНИЕ! НЕ БЕЗОПАСНО! В ТОЧКЕ ПЕРЕСЕНЧИЯ ДАТ! НУЖНО БРАТЬ РАЗНЫЕ ТАБЛИЦЫ!
-        Получить данные за последние x минут (округление до минут, нижнее)
-        :param x: кол-во минут назад (безопасно до 59 включительно)
+        Получить данные за последние x минут (округление до минут, нижнее).
+        Если интервал пересекает полночь, данные берутся из обеих дневных таблиц (get_log_range)
+        :param x: кол-во минут назад
         :param where: дополнительное условие поиска
         :param order_by: сортировка
         :param group_by_crc: группировать по пользователям
         :param ignore_zero_crc: игнорировать crc==0
         :return: [] or None
         """
-        self.day = (self.date - datetime.timedelta(minutes=x)).timetuple().tm_yday - 1
+        date_from = (self.date - datetime.timedelta(minutes=x)).replace(second=0, microsecond=0)
+        date_to = self.date.replace(second=0, microsecond=0)
+        if self.day_of_date(date_from) != self.day_of_date(date_to - datetime.timedelta(microseconds=1)):
+            return self.get_log_range(date_from, date_to, where, order_by, group_by_crc, ignore_zero_crc)
+        self.day = self.day_of_date(date_from)
         where = f"{where} AND " if where else ""
         condition = "%s time >= '%s' AND time < '%s'" % \
                     (
@@ -417,6 +1431,13 @@ class StatDB(BaseMySQLDB):
     Класс для работы с БД Аналитиков MySQL
     """
 
+    MIN_CNT_DELETE_RANGE = 100  # Мин. ширина диапазона первичного ключа в одном DELETE (range режим)
+    MAX_CNT_DELETE_RANGE = 1000000  # Макс. ширина диапазона первичного ключа в одном DELETE (range режим)
+    DELETE_TARGET_LATENCY = 0.5  # Целевое время одного DELETE sec (range режим)
+    MAX_CNT_UPDATE_CASE = 1000  # Макс. кол-во строк в одном 'UPDATE ... CASE' запросе (set-based update)
+    CNT_SCAN_WORKERS = 4  # Кол-во потоков (соединений) параллельного чтения диапазонами ключа по умолчанию
+    _timeout_replication_lag = 1  # Пауза между проверками отставания реплик sec
+
     def __init__(self,
                  db_config,
                  table,
@@ -424,12 +1445,24 @@ class StatDB(BaseMySQLDB):
                  autocommit=True,
                  fast_debug=False,
                  charset=None,
-                 local_infile=0
+                 local_infile=0,
+                 pool=None,
+                 query_cache=None,
                  ):
         BaseMySQLDB.__init__(self, db_config=db_config, auto_commit=autocommit, fast_debug=fast_debug, charset=charset,
-                             local_infile=local_infile)
+                             local_infile=local_infile, pool=pool)
         self.date = date
         self.table = table
+        self.query_cache = query_cache  # QueryCache результатов select_data/get_count_table (None - без кэша)
+
+    def invalidate_cache(self, table=None):
+        """
+        Сбросить закэшированные результаты запросов к таблице (вызывается методами записи)
+        :param table: имя таблицы
+        :return: None
+        """
+        if self.query_cache is not None:
+            self.query_cache.invalidate(table if table else self.table)
 
     @timer
     def get_count_table(self, table=None, where=None):
@@ -443,13 +1476,21 @@ class StatDB(BaseMySQLDB):
         table = table if table else self.table
         where = f" WHERE {where}" if where else ""
         sql = f"SELECT COUNT(1) FROM {table} {where} LIMIT 1;"
+        cache_key = f"{sql} /* {self.db_info()} */" if self.query_cache is not None else None
+        if cache_key:
+            hit, r = self.query_cache.get(cache_key)
+            if hit:
+                return r if r else None
         CLogger.info(f"{Color.Light_Blue}SELECT COUNT(1){CLogger.infoColor} data from {Color.Magenta}{table} "
                      f"{Color.Blue}{self.db_info()}")
         r = self.execute_and_fetch_all(sql=sql, callback=lambda x: x[0][0])[0]
+        if cache_key and r is not None:
+            self.query_cache.put(cache_key, r, tables=(table,))
         return r if r else None
 
     @timer
-    def delete_data(self, order_by, where, offset=None, limit=None, table=None, pure_sql=None):
+    def delete_data(self, order_by, where, offset=None, limit=None, table=None, pure_sql=None, pk=None,
+                    chunk_size=None, target_latency=None, replicas=None, max_replication_lag=None):
         """
         Удалить данные из таблицы
          'DELETE FROM {table} {where} {order by} {limit};'
@@ -460,11 +1501,21 @@ class StatDB(BaseMySQLDB):
         :param limit: кол-во удаляемых записей
         :param table: таблица откуда удаляем
         :param pure_sql: чистый sql, игнорирует прочие настройки, использовать аккуратно!
+        :param pk: целочисленный первичный ключ - включает range режим (delete_data_by_pk_range), order_by,
+        offset, limit и pure_sql игнорируются
+        :param chunk_size: range режим, начальная ширина диапазона ключа
+        :param target_latency: range режим, целевое время одного DELETE sec
+        :param replicas: range режим, [] БД реплик, отставание которых проверяется
+        :param max_replication_lag: range режим, пауза пока отставание реплик больше (sec)
         :return:
             * True - successful
             * False - fail
         """
         table = table if table else self.table
+        if pk:
+            return self.delete_data_by_pk_range(where=where, pk=pk, table=table, chunk_size=chunk_size,
+                                                target_latency=target_latency, replicas=replicas,
+                                                max_replication_lag=max_replication_lag) is not None
         order_by = f" ORDER BY {order_by}" if order_by else ""
         where = f" WHERE {where}" if where else ""
         sql_template = f"DELETE FROM `{table}` {where} {order_by}"
@@ -479,57 +1530,339 @@ class StatDB(BaseMySQLDB):
             sql_template = None
         CLogger.info(f"{Color.Red}DELETE{CLogger.infoColor} data from {Color.Magenta}{table} "
                      f"{Color.Blue}{self.db_info()}")
-        return True if self.execute_and_fetch_all(sql=pure_sql, sql_template=sql_template, delete=True) else False
+        r = self.execute_and_fetch_all(sql=pure_sql, sql_template=sql_template, delete=True)
+        self.invalidate_cache(table)
+        return True if r else False
+
+    @timer
+    @unknown_exception_catcher
+    @sll_exception_catcher
+    def delete_data_by_pk_range(self, where=None, pk="id", table=None, chunk_size=None, target_latency=None,
+                                replicas=None, max_replication_lag=None):
+        """
+        Удаление обходом целочисленного первичного ключа диапазонами:
+         'DELETE FROM {table} WHERE {pk} >= {lo} AND {pk} < {hi} AND ({where});'
+        Каждый запрос затрагивает только свой диапазон индекса (без повторного сканирования с начала, как в
+        'DELETE ... LIMIT n'). Ширина диапазона подстраивается под target_latency (не больше чем x2 за шаг),
+        при заданном max_replication_lag удаление ставится на паузу, пока реплики отстают сильнее.
+        :param where: условие удаления
+        :param pk: целочисленный первичный ключ
+        :param table: таблица откуда удаляем
+        :param chunk_size: начальная ширина диапазона ключа (по умолчанию MAX_CNT_DELETE_ROW)
+        :param target_latency: целевое время одного DELETE sec (по умолчанию DELETE_TARGET_LATENCY)
+        :param replicas: [] БД реплик (BaseMySQLDB), отставание которых проверяется
+        :param max_replication_lag: макс. отставание реплик sec (None - не проверять; задается вместе с replicas)
+        :return:
+            * Cnt<int> - кол-во удаленных строк
+            * None     - fail
+        """
+        if max_replication_lag is not None and not replicas:
+            raise DbCriticalExceptionSLL(message=f"max_replication_lag is set, but replicas are not given! "
+                                                 f"{self.db_info()}", inst=None)
+        table = table if table else self.table
+        chunk_size = chunk_size if chunk_size else self.MAX_CNT_DELETE_ROW
+        target_latency = target_latency if target_latency else self.DELETE_TARGET_LATENCY
+        where = f" AND ({where})" if where else ""
+        r = self.execute_and_fetch_all(sql=f"SELECT MIN({pk}), MAX({pk}) FROM `{table}`;", silence=True)
+        if not r or r[1] is None:
+            return None
+        if not r[0] or r[0][0][0] is None:
+            return 0
+        lo, max_pk = int(r[0][0][0]), int(r[0][0][1])
+        CLogger.info(f"{Color.Red}DELETE RANGE{CLogger.infoColor} data from {Color.Magenta}{table} "
+                     f"{Color.Blue}{self.db_info()}{CLogger.infoColor} ({pk} in [{lo}, {max_pk}])")
+        cnt_deleted = 0
+        start_time = time.perf_counter()
+        status_bar = ProgressBar("[DELETE RANGE] it is processed", max_cnt_value=max_pk - lo + 1,
+                                 every_cnt_percent=10, silence=False)
+        while lo <= max_pk:
+            if max_replication_lag is not None:
+                self._wait_replication_lag(replicas, max_replication_lag)
+            hi = lo + chunk_size
+            query_time = time.perf_counter()
+            with self._db_connection.cursor() as cursor:
+                if not self._execute(cursor=cursor, sql=f"DELETE FROM `{table}` WHERE {pk} >= {lo} AND {pk} < {hi}"
+                                                        f"{where};", silence=True):
+                    CLogger.error(f"DELETE RANGE {pk} in [{lo}, {hi}) failed, {cnt_deleted} records deleted before")
+                    self.invalidate_cache(table)
+                    return None
+                cnt_deleted += max(cursor.rowcount, 0)
+            query_time = time.perf_counter() - query_time
+            status_bar.increment_counter_n(min(hi, max_pk + 1) - lo)
+            lo = hi
+            if self.fast_debug:
+                break
+            factor = min(max(target_latency / query_time, 0.5), 2) if query_time > 0 else 2
+            chunk_size = min(max(int(chunk_size * factor), self.MIN_CNT_DELETE_RANGE), self.MAX_CNT_DELETE_RANGE)
+        self.invalidate_cache(table)
+        duration = time.perf_counter() - start_time
+        CLogger.info(f"\tSuccessful deleted {cnt_deleted} records in {duration:.2f} sec "
+                     f"({cnt_deleted / duration if duration > 0 else 0:.0f} rows/sec)")
+        return cnt_deleted
+
+    @staticmethod
+    def _wait_replication_lag(replicas, max_replication_lag):
+        """
+        Ждать, пока отставание всех реплик не станет не больше max_replication_lag
+        (реплика с неизвестным отставанием - ошибка запроса или остановленная репликация - считается отстающей)
+        """
+        while True:
+            lags = [db.get_replication_lag() for db in replicas]
+            if all(lag is not None and lag <= max_replication_lag for lag in lags):
+                return
+            lag = "unknown" if None in lags else f"{max(lags)} sec"
+            CLogger.warning(f"Replication lag {lag} > {max_replication_lag} sec. "
+                            f"Pause {StatDB._timeout_replication_lag} sec")
+            time.sleep(StatDB._timeout_replication_lag)
 
     @timer
-    def insert_multi_data(self, columns, data, table=None):
+    def insert_multi_data(self, columns, data, table=None, bulk_load=False, checkpoint_file=None,
+                          ignore_duplicates=False):
         """
         Множественный insert в БД c пагинацией
         :param columns: столбцы
         :param data: []<tuple> - данные вставки
         :param table: имя таблицы
+        :param bulk_load: грузить через LOAD DATA LOCAL INFILE (если local_infile включен)
+        :param checkpoint_file: файл смещения для продолжения прерванной загрузки (см. execute)
+        :param ignore_duplicates: повторные пачки выполнять как 'INSERT IGNORE' (см. execute)
         :return:
             * True - success
             * False - fail
         """
         table = table if table else self.table
+        if data and bulk_load:
+            if self.local_infile:
+                return True if self.load_data_infile(columns=columns, data=data, table=table) else False
+            CLogger.warning(f"bulk_load requested, but local_infile is off. Use executemany. {self.db_info()}")
         if data:
             ss = ('%s,' * len(columns))[:-1]  # '%s,%s,%s,...,%s')
             sql = f"INSERT INTO `{table}` ({','.join(columns)}) VALUES ({ss});"
             CLogger.info(f"{Color.Green}INSERT MULTI{CLogger.infoColor} data to {Color.Magenta}{table} "
                          f"{Color.Blue}{self.db_info()}")
-            return self.execute(sql=sql, execute_many_data=data)
+            r = self.execute(sql=sql, execute_many_data=data, checkpoint_file=checkpoint_file,
+                             ignore_duplicates=ignore_duplicates)
+            self.invalidate_cache(table)
+            return r
 
     @timer
-    def update_multi_data(self, columns, data, condition=None, table=None):
+    def load_data_infile(self, columns: [], data: any, table: any = None, chunk_rows: int = None) -> any:
+        """
+        Массовая загрузка через 'LOAD DATA LOCAL INFILE' (требует local_infile=1 в конструкторе и на сервере).
+        Строки пишутся во временный TSV файл (pymysql отдает серверу файл по имени), NULL/таб/перевод строки
+        экранируются по правилам LOAD DATA (ESCAPED BY '\\'), bytes (BLOB/BINARY) пишутся без перекодирования.
+        :param columns: столбцы
+        :param data: []<tuple> или итератор tuple, либо file-like объект (текстовый или двоичный) с уже готовым TSV
+        :param table: имя таблицы
+        :param chunk_rows: макс. кол-во строк в одном файле/запросе (по умолчанию MAX_CNT_LOAD_DATA_INFILE)
+        :return:
+            * (Cnt<int>, Warnings<int>) - кол-во загруженных строк и предупреждений сервера
+            * None - fail
+        """
+        table = table if table else self.table
+        if not self.local_infile:
+            raise DbCriticalExceptionSLL(message=f"LOAD DATA LOCAL INFILE requires local_infile=1! {self.db_info()}",
+                                         inst=None)
+        chunk_rows = chunk_rows if chunk_rows else self.MAX_CNT_LOAD_DATA_INFILE
+        chunk_rows = chunk_rows if not self.fast_debug else self.MAX_CNT_FAST_DEBUG
+        CLogger.info(f"{Color.Green}LOAD DATA INFILE{CLogger.infoColor} data to {Color.Magenta}{table} "
+                     f"{Color.Blue}{self.db_info()}")
+        rows = iter(data) if not hasattr(data, "read") else None
+        cnt_loaded = cnt_warnings = 0
+        while True:
+            with tempfile.NamedTemporaryFile(mode="wb", suffix=".tsv", delete=False) as tsv:
+                path = tsv.name
+                if rows is None:
+                    self._copy_tsv(data, tsv)
+                    cnt_written = None
+                else:
+                    cnt_written = self._write_tsv(tsv, itertools.islice(rows, chunk_rows))
+            try:
+                if cnt_written == 0:
+                    break
+                sql = f"LOAD DATA LOCAL INFILE {self._db_connection.escape(path)} INTO TABLE `{table}` " \
+                    f"CHARACTER SET utf8mb4 FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' " \
+                    f"LINES TERMINATED BY '\\n' ({','.join(columns)});"
+                with self._db_connection.cursor() as cursor:
+                    if self._execute(cursor=cursor, sql=sql) is None:
+                        return None
+                    cnt_loaded += cursor.rowcount
+                    warning_count = getattr(cursor, "warning_count", 0)
+                if warning_count:
+                    cnt_warnings += warning_count
+                    CLogger.warning(f"LOAD DATA INFILE to {table}: {warning_count} warnings. First: "
+                                    f"{self._db_connection.show_warnings()[:self.MAX_CNT_VIEW_LOG_DATA]}")
+            finally:
+                os.remove(path)
+            self.invalidate_cache(table)
+            CLogger.info(f"\tSuccessful loaded {cnt_loaded} records! Warnings: {cnt_warnings}")
+            if cnt_written is None or cnt_written < chunk_rows or self.fast_debug:
+                break
+        return cnt_loaded, cnt_warnings
+
+    @staticmethod
+    def _write_tsv(file: any, rows: any) -> int:
+        """
+        Запись строк в TSV формате LOAD DATA: None -> \\N, экранирование '\\', таба, перевода строки и NUL
+        :param file: открытый на запись двоичный файл
+        :param rows: итератор tuple
+        :return: кол-во записанных строк
+        """
+        cnt = 0
+        for row in rows:
+            file.write(b"\t".join([_tsv_value(v) for v in row]))
+            file.write(b"\n")
+            cnt += 1
+        return cnt
+
+    @staticmethod
+    def _copy_tsv(source: any, file: any, chunk_size: int = 1024 * 1024) -> None:
+        """
+        Копирование готового TSV: двоичный поток - как есть, текстовый - в utf8
+        :param source: file-like объект
+        :param file: открытый на запись двоичный файл
+        """
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            file.write(chunk if isinstance(chunk, (bytes, bytearray)) else chunk.encode("utf-8"))
+
+    @timer
+    def update_multi_data(self, columns, data, condition=None, table=None, keys=None, bulk=None):
         """
         Множественный update в БД c пагинацией
         :param columns: столбцы
         :param condition: условие обновления
         :param data: []<tuple> - данные обновления
         :param table: имя таблицы
+        :param keys: [] ключевых столбцов - включает set-based режим (condition игнорируется):
+        строка data - значения columns, затем значения keys; при повторе ключа берется последняя строка
+        :param bulk: set-based режим
+            * 'case' - 'UPDATE ... SET c = CASE WHEN key THEN v ... END WHERE key IN (...)' пачками
+            MAX_CNT_UPDATE_CASE строк (для средних объемов)
+            * 'join' - строки грузятся во временную таблицу многострочным INSERT, затем один
+            'UPDATE table JOIN tmp USING(keys)' на пачку MAX_CNT_EXECUTEMANY_DATA строк
+            * None - 'case' если строк не больше MAX_CNT_UPDATE_CASE, иначе 'join'
         :return:
             * True - success
             * False - fail
         """
         table = table if table else self.table
+        if data and keys:
+            return self.update_multi_data_bulk(columns=columns, data=data, keys=keys, table=table, bulk=bulk)
         condition = f"WHERE {condition}" if condition else ""
         if data:
             set = "=%s,".join(columns) + "=%s"
             sql = f"UPDATE `{table}` SET {set} {condition};"
             CLogger.info(f"{Color.Yellow}UPDATE MULTI{CLogger.infoColor} data in {Color.Magenta}{table} "
                          f"{Color.Blue}{self.db_info()}")
-            return self.execute(sql=sql, execute_many_data=data)
+            r = self.execute(sql=sql, execute_many_data=data)
+            self.invalidate_cache(table)
+            return r
+
+    @timer
+    @unknown_exception_catcher
+    @sll_exception_catcher
+    def update_multi_data_bulk(self, columns, data, keys, table=None, bulk=None):
+        """
+        Set-based update (см. update_multi_data)
+        :param columns: столбцы
+        :param data: []<tuple> - значения columns, затем значения keys
+        :param keys: [] ключевых столбцов
+        :param table: имя таблицы
+        :param bulk: 'case', 'join' или None - выбор по объему
+        :return:
+            * True - success
+            * False - fail
+        """
+        table = table if table else self.table
+        cnt_columns = len(columns)
+        rows = list({tuple(row[cnt_columns:]): row for row in data}.values())  # дубли ключа - последняя строка
+        bulk = bulk if bulk else "case" if len(rows) <= self.MAX_CNT_UPDATE_CASE else "join"
+        CLogger.info(f"{Color.Yellow}UPDATE BULK ({bulk}){CLogger.infoColor} {len(rows)} rows in "
+                     f"{Color.Magenta}{table} {Color.Blue}{self.db_info()}")
+        if bulk == "case":
+            chunk_size = self.MAX_CNT_UPDATE_CASE
+        elif bulk == "join":
+            chunk_size = self.MAX_CNT_EXECUTEMANY_DATA
+        else:
+            raise DbCriticalExceptionSLL(message=f"Unknown bulk update mode {bulk!r}!", inst=None)
+        status_bar = ProgressBar(f"[UPDATE BULK] it is processed", max_cnt_value=len(rows),
+                                 every_cnt_percent=10, silence=False)
+        with contextlib.ExitStack() as stack:
+            tmp_table = stack.enter_context(self.temporary_table(table, list(columns) + list(keys), keys=keys)) \
+                if bulk == "join" else None
+            with self._db_connection.cursor() as cursor:
+                for offset in range(0, len(rows), chunk_size):
+                    chunk = rows[offset:offset + chunk_size]
+                    if tmp_table:
+                        r = self._update_join(cursor, table, tmp_table, columns, keys, chunk)
+                    else:
+                        r = self._update_case(cursor, table, columns, keys, chunk)
+                    if not r:
+                        self.invalidate_cache(table)
+                        return False
+                    status_bar.increment_counter_n(len(chunk))
+                    if self.fast_debug:
+                        break
+        self.invalidate_cache(table)
+        return True
+
+    def _update_case(self, cursor, table, columns, keys, chunk):
+        """
+        Одна пачка: 'UPDATE t SET c = CASE WHEN (k1=%s AND k2=%s) THEN %s ... ELSE c END WHERE (k1,k2) IN (...)'
+        :return: True - success, None - fail
+        """
+        cnt_columns = len(columns)
+        when = " AND ".join(f"{k}=%s" for k in keys)
+        key_tuple = f"({','.join(['%s'] * len(keys))})" if len(keys) > 1 else "%s"
+        cases = ", ".join(f"{c} = CASE {' '.join([f'WHEN {when} THEN %s'] * len(chunk))} ELSE {c} END"
+                          for c in columns)
+        sql = f"UPDATE `{table}` SET {cases} " \
+              f"WHERE ({','.join(keys)}) IN ({','.join([key_tuple] * len(chunk))});" if len(keys) > 1 else \
+              f"UPDATE `{table}` SET {cases} WHERE {keys[0]} IN ({','.join([key_tuple] * len(chunk))});"
+        args = []
+        for i in range(cnt_columns):
+            for row in chunk:
+                args.extend(row[cnt_columns:])
+                args.append(row[i])
+        for row in chunk:
+            args.extend(row[cnt_columns:])
+        return self._execute(cursor=cursor, sql=sql, silence=True, args=args)
+
+    def _update_join(self, cursor, table, tmp_table, columns, keys, chunk):
+        """
+        Одна пачка: многострочный INSERT во временную таблицу и 'UPDATE t JOIN tmp USING(keys)'
+        :return: True - success, None - fail (на первом неуспешном запросе)
+        """
+        if not self._execute(cursor=cursor, sql=f"DELETE FROM {tmp_table};", silence=True):
+            return None
+        all_columns = list(columns) + list(keys)
+        if not self._execute(cursor=cursor, sql=f"INSERT INTO {tmp_table} ({','.join(all_columns)}) "
+                                                f"VALUES ({','.join(['%s'] * len(all_columns))})",
+                             execute_many_data=chunk, silence=True):
+            return None
+        assignments = ", ".join(f"`{table}`.{c} = {tmp_table}.{c}" for c in columns)
+        return self._execute(cursor=cursor, sql=f"UPDATE `{table}` JOIN {tmp_table} USING ({','.join(keys)}) "
+                                                f"SET {assignments};", silence=True)
 
     @sll_exception_catcher
     @timer
-    def insert_or_on_duplicate_key_update(self, columns: [], data: [], table: any = None, silence: bool = False):
+    def insert_or_on_duplicate_key_update(self, columns: [], data: [], table: any = None, silence: bool = False,
+                                          row_alias: any = None, bind: bool = False):
         """
-        Вставка или update при дубликате ключа
+        Вставка или update при дубликате ключа.
+        Данные отправляются многострочными 'INSERT ... VALUES (...),(...) ON DUPLICATE KEY UPDATE' запросами,
+        длина одного запроса ограничена max_allowed_packet.
+        Значение None в строке не перезаписывает существующее значение колонки (COALESCE).
         :param columns: столбцы
-        :param data: []<tuple> - данные вставки
+        :param data: []<tuple> - данные вставки: sql литералы (строки уже в кавычках) или выражения, как в
+        insert_one_record
         :param table: имя таблицы
         :param silence:
+        :param row_alias: алиас вставляемой строки (MySQL >= 8.0.19) вместо устаревшей функции VALUES(col)
+        :param bind: data - значения python, связываются параметрами (pymysql executemany, экранирует драйвер)
         :return:
             * True - success
             * False - fail
@@ -537,64 +1870,247 @@ class StatDB(BaseMySQLDB):
         table = table if table else self.table
         if data:
             try:
+                if row_alias:
+                    upd_val = ','.join(f"{c}=COALESCE({row_alias}.{c},{c})" for c in columns)
+                    alias = f" AS {row_alias}"
+                else:
+                    upd_val = ','.join(f"{c}=COALESCE(VALUES({c}),{c})" for c in columns)
+                    alias = ""
+                prefix = f"INSERT INTO `{table}` ({','.join(columns)}) VALUES "
+                suffix = f"{alias} ON DUPLICATE KEY UPDATE {upd_val};"
+                max_stmt_length = self.get_max_allowed_packet() - self._max_allowed_packet_reserve
                 with self._db_connection.cursor() as cursor:
+                    cursor.max_stmt_length = max_stmt_length  # pymysql склеивает строки executemany до этой длины
                     CLogger.info(f"{Color.Magenta}INSERT on DUPLICATE UPDATE{CLogger.infoColor} data to "
                                  f"{Color.Magenta}{table} {Color.Blue}{self.db_info()}")
                     status_bar = ProgressBar("[INSERT or UPDATE] it is processed", max_cnt_value=len(data),
                                              every_cnt_percent=10, silence=False)
-                    for d in data:
-                        upd_val = []
-                        for i, e in enumerate(d):
-                            if e is not None:
-                                upd_val.append(columns[i] + "=" + str(e))
-                        status_bar.increment_counter()
-                        sql = f"INSERT INTO `{table}` ({','.join(columns)}) " \
-                            f"VALUES ({','.join(str(e) for e in d)}) " \
-                            f"ON DUPLICATE KEY UPDATE {','.join(upd_val)};"
-                        self._execute(cursor=cursor, sql=sql, silence=silence)
+                    for offset in range(0, len(data), self.MAX_CNT_EXECUTEMANY_DATA):
+                        chunk = data[offset:offset + self.MAX_CNT_EXECUTEMANY_DATA]
+                        if bind:
+                            ok = self._execute(cursor=cursor, sql=f"{prefix}({','.join(['%s'] * len(columns))})"
+                                                                  f"{suffix}", execute_many_data=chunk, silence=silence)
+                        else:
+                            ok = all(self._execute(cursor=cursor, sql=sql, silence=silence)
+                                     for sql in self._multi_row_sqls(prefix, suffix, chunk, max_stmt_length))
+                        if not ok:
+                            return False
+                        status_bar.increment_counter_n(len(chunk))
+                        if self.fast_debug:
+                            break
+                self.invalidate_cache(table)
+                return True
             except Exception as inst:
                 raise DbCriticalExceptionSLL("Unknown error", inst=inst)
 
+    @staticmethod
+    def _multi_row_sqls(prefix: str, suffix: str, rows: list, max_stmt_length: int) -> any:
+        """
+        Многострочные запросы '{prefix}(...),(...){suffix}' из строк sql литералов (None - NULL),
+        длина запроса (байт) не больше max_stmt_length (строка длиннее лимита уходит отдельным запросом)
+        :return: генератор запросов
+        """
+        values = []
+        size = len(prefix.encode()) + len(suffix.encode())
+        for row in rows:
+            value = f"({','.join('NULL' if e is None else str(e) for e in row)})"
+            cnt_bytes = len(value.encode()) + 1
+            if values and size + cnt_bytes > max_stmt_length:
+                yield f"{prefix}{','.join(values)}{suffix}"
+                values = []
+                size = len(prefix.encode()) + len(suffix.encode())
+            values.append(value)
+            size += cnt_bytes
+        if values:
+            yield f"{prefix}{','.join(values)}{suffix}"
+
     @timer
-    def insert_and_get_last_id(self, columns, data, table=None):
+    def insert_and_get_last_id(self, columns, data, table=None, bind=False):
         """
         Одиночная вставка и получение id вставленной записи
         :param columns: колонки для инсерта
-        :param data: []<str> инсерт данные соотв. колонкам
+        :param data: []<str> инсерт данные соотв. колонкам (sql литералы и выражения, например "'abc'", "NOW()")
         :param table: таблица
+        :param bind: data - значения python, связываются параметрами (экранирует драйвер, выражения недопустимы)
         :return:
             last_row_id<int> - id вставленной записи  (None if fail)
         """
         last_id = None
         table = table if table else self.table
         if data:
-            sql = f"INSERT INTO `{table}` ({','.join(columns)}) VALUES ({','.join(data)});"
+            values = ','.join(['%s'] * len(data)) if bind else ','.join(data)
+            sql = f"INSERT INTO `{table}` ({','.join(columns)}) VALUES ({values});"
             CLogger.info(f"{Color.Green}INSERT{CLogger.infoColor} data to "
                          f"{Color.Magenta}{table} {Color.Blue}{self.db_info()}")
-            result, last_id = self.execute(sql=sql, get_lastrowid=True)
+            r = self.execute_params(sql=sql, args=data, get_lastrowid=True) if bind else \
+                self.execute(sql=sql, get_lastrowid=True)
+            self.invalidate_cache(table)
+            last_id = r[1] if r else None
         return last_id
 
     @timer
-    def insert_one_record(self, columns: [], data: [], table: any = None) -> any:
+    def insert_one_record(self, columns: [], data: [], table: any = None, bind: bool = False) -> any:
         """
         Вставка одиночной записи, просто удобный wrapper
         :param columns: колонки для инсерта
-        :param data: []<str> инсерт данные соотв. колонкам
+        :param data: []<str> инсерт данные соотв. колонкам (sql литералы и выражения, например "'abc'", "NOW()")
         :param table: таблица
+        :param bind: data - значения python, связываются параметрами (экранирует драйвер, выражения недопустимы)
         :return:
             * True - successful result.
             * None - exceptions exists
         """
         table = table if table else self.table
         if data:
-            sql = f"INSERT INTO `{table}` ({','.join(columns)}) VALUES ({','.join(data)});"
+            values = ','.join(['%s'] * len(data)) if bind else ','.join(data)
+            sql = f"INSERT INTO `{table}` ({','.join(columns)}) VALUES ({values});"
             CLogger.info(f"{Color.Green}INSERT{CLogger.infoColor} data to "
                          f"{Color.Magenta}{table} {Color.Blue}{self.db_info()}")
-            return self.execute(sql=sql)
+            r = self.execute_params(sql=sql, args=data) if bind else self.execute(sql=sql)
+            self.invalidate_cache(table)
+            return r
+
+    @timer
+    def select_data_partitioned(self, columns: [], where: any = None, pk: str = "id", table: any = None,
+                                callback: any = None, workers: int = None, partitions: int = None,
+                                batch_size: int = None) -> any:
+        """
+        Параллельное чтение таблицы диапазонами целочисленного ключа: диапазон [MIN(pk), MAX(pk)] делится
+        на partitions равных срезов 'pk >= lo AND pk < hi', срезы читаются потоково (SSCursor) в workers потоков,
+        у каждого потока свое соединение (worker_connection). Порядок строк между срезами не гарантирован.
+        :param columns: [] колонок таблицы
+        :param where: условие
+        :param pk: целочисленный (индексированный) ключ
+        :param table: таблица
+        :param callback: функция колбэк, принимает []<tuple> - очередную пачку строк среза.
+        Вызывается из потоков чтения одновременно, должна быть потокобезопасной
+        :param workers: кол-во потоков / соединений (по умолчанию CNT_SCAN_WORKERS)
+        :param partitions: кол-во срезов (по умолчанию workers; больше workers - выравнивание при неравномерном ключе)
+        :param batch_size: размер пачки (по умолчанию MAX_CNT_STREAM_BATCH)
+        :return:
+            * Cnt<int>  - кол-во обработанных строк (есть callback)
+            * Generator - генератор строк (нет callback): строки срезов по мере получения,
+            в очереди не больше 2 * workers пачек (память ограничена)
+            * None      - fail
+        """
+        table = table if table else self.table
+        workers = workers if workers else self.CNT_SCAN_WORKERS
+        partitions = partitions if partitions else workers
+        batch_size = batch_size if batch_size else self.MAX_CNT_STREAM_BATCH
+        r = self.execute_and_fetch_all(sql=f"SELECT MIN({pk}), MAX({pk}) FROM `{table}`;", silence=True)
+        if not r or r[1] is None:
+            return None
+        if not r[0] or r[0][0][0] is None:
+            return 0 if callback else iter(())
+        min_pk, max_pk = int(r[0][0][0]), int(r[0][0][1])
+        step = -(-(max_pk - min_pk + 1) // partitions)
+        where = f" AND ({where})" if where else ""
+        sqls = [f"SELECT {','.join(columns)} FROM `{table}` WHERE {pk} >= {lo} AND {pk} < {min(lo + step, max_pk + 1)}"
+                f"{where};" for lo in range(min_pk, max_pk + 1, step)]
+        workers = min(workers, len(sqls))
+        CLogger.info(f"{Color.Blue}SELECT PARTITIONED{CLogger.infoColor} data from {Color.Magenta}{table} "
+                     f"{Color.Blue}{self.db_info()}{CLogger.infoColor} ({pk} in [{min_pk}, {max_pk}], "
+                     f"{len(sqls)} partitions, {workers} workers)")
+        if callback is None:
+            return self._iter_partitions(sqls, workers, batch_size)
+        stop = threading.Event()
+
+        def consume(batch):
+            if stop.is_set():
+                raise StopIteration  # другой срез завершился ошибкой
+            try:
+                callback(batch)
+            except Exception as inst_callback:
+                raise DbCriticalExceptionSLL(f"Problem when call 'callback'! ", inst_callback)
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = [executor.submit(self._scan_partition, sql, batch_size, consume) for sql in sqls]
+            done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_EXCEPTION)
+            for future in done:
+                future.result()  # первая ошибка среза прерывает чтение остальных
+            return sum(future.result() for future in futures)
+        finally:
+            stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _iter_partitions(self, sqls: list, workers: int, batch_size: int) -> any:
+        """
+        Генератор строк срезов: потоки чтения кладут пачки в ограниченную очередь, текущий поток отдает строки.
+        При закрытии генератора или ошибке среза потоки чтения останавливаются, не начатые срезы отменяются.
+        """
+        batches = queue.Queue(maxsize=2 * workers)
+        stop = threading.Event()
+
+        def put(batch):
+            while not stop.is_set():
+                try:
+                    batches.put(batch, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+            raise StopIteration
+
+        def scan(sql):
+            try:
+                self._scan_partition(sql, batch_size, put)
+                put(None)  # срез прочитан
+            except StopIteration:
+                pass
+            except Exception as inst_scan:
+                with contextlib.suppress(StopIteration):
+                    put(inst_scan)  # ошибка среза - генератор прерывается сразу
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        try:
+            for sql in sqls:
+                executor.submit(scan, sql)
+            cnt_pending = len(sqls)
+            while cnt_pending:
+                batch = batches.get()
+                if batch is None:
+                    cnt_pending -= 1
+                elif isinstance(batch, Exception):
+                    raise batch
+                else:
+                    yield from batch
+        finally:
+            stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _scan_partition(self, sql: str, batch_size: int, consume: any) -> int:
+        """
+        Потоковое чтение одного среза через отдельное соединение, пачки строк передаются в consume.
+        Если чтение прервано (остановка из consume или ошибка), соединение закрывается: SSCursor.close()
+        дочитал бы остаток среза с сервера до конца.
+        :return: кол-во прочитанных строк
+        """
+        cnt = 0
+        with self.worker_connection():
+            connection = self._db_connection
+            cursor = connection.cursor(pymysql.cursors.SSCursor)
+            try:
+                if not self._execute(cursor=cursor, sql=sql, silence=True):
+                    raise DbCriticalExceptionSLL(message=f"Can't select partition! {self.db_info()}", inst=None)
+                while True:
+                    batch = cursor.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    cnt += len(batch)
+                    consume(batch)
+                    if self.fast_debug:
+                        break
+            except BaseException:
+                if connection.open:  # курсор не закрывается - непрочитанный результат сбрасывается с соединением
+                    connection.close()
+                raise
+            cursor.close()
+        return cnt
 
     @timer
     def select_data(self, columns: [], where: any = None, order_by: any = None, offset: any = None, limit: any = None,
-                    table: any = None, pure_sql: any = None, callback: any = None) -> any:
+                    table: any = None, pure_sql: any = None, callback: any = None, keyset: any = None,
+                    stream: bool = False, columnar: bool = False, partitions: int = 0) -> any:
         """
         Внимание! параметр sql используется только для осуществления простых запросов без пагинации.
         :param columns: [] колонок таблицы
@@ -605,11 +2121,31 @@ class StatDB(BaseMySQLDB):
         :param table: таблица
         :param pure_sql: чистый sql использовать только если понимаешь что делаешь!
         :param callback: функция колбэк для обработки данных
+        :param keyset: индексированная UNIQUE NOT NULL колонка (или список колонок) для keyset пагинации,
+        order_by игнорируется
+        Если задан query_cache, результат без callback/stream кэшируется (pure_sql помечается таблицей table)
+        :param stream: потоковое чтение одним запросом (SSCursor): callback вызывается на каждую пачку строк,
+        без callback возвращается генератор строк
+        :param columnar: вернуть результат по колонкам (fetch_columns, потоковое чтение одним запросом)
+        :param partitions: > 0 - параллельное чтение диапазонами целочисленного ключа (keyset или 'id')
+        в partitions потоков, см. select_data_partitioned (order_by, offset, limit, pure_sql игнорируются)
         :return:
             * Obj<list> - Result of cursor.fetchall() or Result after callback func
+            * Cnt<int>  - кол-во обработанных строк (stream=True или partitions > 0 и есть callback)
+            * Generator - генератор строк (stream=True или partitions > 0 и нет callback)
+            * ResultColumns - колонки (columnar=True)
             * None      - exceptions exists or errors
         """
+        if partitions:
+            if keyset and not isinstance(keyset, str):
+                raise DbCriticalExceptionSLL(message=f"Partitioned select needs one integer key column, "
+                                                     f"got keyset {keyset!r}!", inst=None)
+            return self.select_data_partitioned(columns, where=where, pk=keyset if keyset else "id", table=table,
+                                                callback=callback, workers=partitions)
+        keyset_where = where
         where = f" WHERE {where} " if where else ""
+        if keyset:  # при keyset пагинации сортировка задается ключом
+            order_by = ",".join([keyset] if isinstance(keyset, str) else keyset)
         order_by = f" ORDER BY {order_by} " if order_by else ""
         table = table if table else self.table
         sql_template = f"SELECT {','.join(columns)} FROM `{table}` {where} {order_by}"
@@ -619,11 +2155,28 @@ class StatDB(BaseMySQLDB):
                 offset = offset if offset else 0
                 pure_sql = f"{sql_template} LIMIT {offset}, {limit};"
                 sql_template = None
+            elif keyset and not stream and not columnar:  # WHERE и ORDER BY добавляются внутри keyset пагинации
+                sql_template = f"SELECT {','.join(columns)} FROM `{table}`"
         else:
             sql_template = None
+        cache_key = f"{pure_sql if pure_sql else sql_template} /* {self.db_info()} keyset={keyset} " \
+            f"where={keyset_where} */" \
+            if self.query_cache is not None and not stream and not columnar and callback is None else None
+        if cache_key:
+            hit, r = self.query_cache.get(cache_key)
+            if hit:
+                return r
         CLogger.info(f"{Color.Blue}SELECT{CLogger.infoColor} data from {Color.Magenta}{table} "
                      f"{Color.Blue}{self.db_info()}")
-        r = self.execute_and_fetch_all(sql=pure_sql, sql_template=sql_template, callback=callback)
+        if stream:
+            sql = pure_sql if pure_sql else f"{sql_template};"
+            return self.stream_query(sql=sql, callback=callback) if callback else self.iter_select(sql=sql)
+        if columnar:
+            return self.fetch_columns(sql=pure_sql if pure_sql else f"{sql_template};")
+        r = self.execute_and_fetch_all(sql=pure_sql, sql_template=sql_template, callback=callback, keyset=keyset,
+                                       keyset_where=keyset_where)
+        if cache_key and r:
+            self.query_cache.put(cache_key, r[0], tables=(table,))
         return r[0] if r else None
 
 
@@ -632,9 +2185,26 @@ class DemultiplexorDB:
     Класс для удобной работы по схеме (1:M) 1 master - many slave
     """
 
-    def __init__(self, master_db: any, mas_slave_db: any, remove_none_db: bool = True):
+    READ_ROUND_ROBIN = "round_robin"
+    READ_LEAST_OUTSTANDING = "least_outstanding"
+
+    def __init__(self, master_db: any, mas_slave_db: any, remove_none_db: bool = True, parallel: bool = False,
+                 max_workers: any = None, slave_timeout: any = None, read_policy: str = READ_ROUND_ROBIN,
+                 max_replication_lag: any = None, health_check_interval: float = 10):
         self.master = master_db  # мастер
         self.slaves = [db for db in mas_slave_db if db] if remove_none_db else mas_slave_db  # массив слейвов
+        self.parallel = parallel  # исполнять slave_execute/connect/cleanup параллельно в пуле потоков
+        self.max_workers = max_workers  # размер пула потоков (по умолчанию - по числу БД)
+        self.slave_timeout = slave_timeout  # таймаут (sec) ожидания результата слейва в параллельном режиме
+        self.slave_errors = []  # исключения по слейвам последнего параллельного вызова (None - успешно)
+        self.read_policy = read_policy  # выбор слейва для чтения: round_robin, least_outstanding
+        self.max_replication_lag = max_replication_lag  # макс. Seconds_Behind_Master слейва для чтения (None - любой)
+        self.health_check_interval = health_check_interval  # период (sec) проверки лага и повтора упавшего слейва
+        self._read_lock = threading.Lock()
+        self._read_counter = 0
+        self._outstanding = [0] * len(self.slaves)  # кол-во выполняющихся чтений по слейвам
+        self._slave_locks = [threading.Lock() for _ in self.slaves]  # соединение слейва без пула - одно на всех
+        self._slave_health = [(0, True) for _ in self.slaves]  # (время проверки, слейв пригоден для чтения)
 
     def __enter__(self):
         self.connect()
@@ -644,15 +2214,132 @@ class DemultiplexorDB:
         self.cleanup()
 
     def connect(self):
-        for db in itertools.chain([self.master], self.slaves):
-            if db:
+        dbs = [db for db in itertools.chain([self.master], self.slaves) if db]
+        if self.parallel:
+            self._run_parallel([lambda db=db: db.connect() for db in dbs], name="connect")
+        else:
+            for db in dbs:
                 db.connect()
 
     def cleanup(self):
-        for db in itertools.chain([self.master], self.slaves):
-            if db:
+        dbs = [db for db in itertools.chain([self.master], self.slaves) if db]
+        if self.parallel:
+            self._run_parallel([lambda db=db: db.cleanup() for db in dbs], name="cleanup")
+        else:
+            for db in dbs:
                 db.cleanup()
 
+    def _run_parallel(self, calls: list, name: str, timeout: any = None) -> (list, list):
+        """
+        Выполнить функции в пуле потоков, дождаться всех (не дольше timeout sec от старта)
+        Исключения не прерывают остальные вызовы, а собираются в список ошибок.
+        Внимание! Вызов, не уложившийся в таймаут, продолжает работать в фоне (поток нельзя прервать).
+        :param calls: [] функций без аргументов
+        :param name: имя операции для логирования
+        :param timeout: таймаут sec
+        :return: [] результатов и [] исключений (None - успешно), порядок соответствует calls
+        """
+        result = [None] * len(calls)
+        errors = [None] * len(calls)
+        if not calls:
+            return result, errors
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers or len(calls))
+        try:
+            futures = [executor.submit(call) for call in calls]
+            deadline = time.monotonic() + timeout if timeout else None
+            for i, future in enumerate(futures):
+                try:
+                    result[i] = future.result(timeout=max(deadline - time.monotonic(), 0) if deadline else None)
+                except concurrent.futures.TimeoutError as inst_timeout:
+                    errors[i] = DemultiplexorExceptionSLL(inst=inst_timeout, message=f"{name} #{i}: timeout {timeout}")
+                except Exception as inst:
+                    errors[i] = inst
+                if errors[i] is not None:
+                    CLogger.exception(errors[i], f"\n[SLL EXCEPTION] by Demultiplexor in parallel {name} #{i}")
+        finally:
+            executor.shutdown(wait=False)
+        return result, errors
+
+    def select_data(self, *args, **kwargs):
+        """
+        select_data на одном из здоровых слейвов (при ошибке - на мастере), см. read()
+        """
+        return self.read("select_data", *args, **kwargs)
+
+    def execute_and_fetch_all(self, *args, **kwargs):
+        """
+        execute_and_fetch_all на одном из здоровых слейвов (при ошибке - на мастере), см. read()
+        """
+        return self.read("execute_and_fetch_all", *args, **kwargs)
+
+    def read(self, method_name: str, *args, **kwargs):
+        """
+        Чтение с балансировкой по слейвам (self.read_policy), мастер разгружается от SELECT запросов.
+        Слейвы с отставанием больше max_replication_lag, с закрытым соединением или упавшие на предыдущем
+        чтении пропускаются (повторная проверка через health_check_interval sec).
+        Если подходящих слейвов нет или все упали - запрос выполняется на мастере.
+        Упавшим считается чтение, в котором был запрос с ошибкой (ошибки гасятся внутри методов слейва,
+        см. cnt_query_errors) или execute_and_fetch_all вернул None.
+        Потокобезопасно: слейв без пула обслуживает одно чтение за раз, слейв с пулом - через worker_connection.
+        :param method_name: <str> имя метода чтения
+        :param args: <tuple> неименнованные агрументы (кортеж)
+        :param kwargs: {} именнованные агрументы (словарь)
+        :return: result of method
+        """
+        for n in self._read_candidates():
+            slave = self.slaves[n]
+            with self._read_lock:
+                self._outstanding[n] += 1
+            try:
+                with self._slave_locks[n] if not getattr(slave, "pool", None) else slave.worker_connection():
+                    cnt_errors = getattr(slave, "cnt_query_errors", 0)
+                    result = slave.__getattribute__(method_name)(*args, **kwargs)
+                    if getattr(slave, "cnt_query_errors", 0) != cnt_errors or \
+                            result is None and method_name == "execute_and_fetch_all":
+                        raise DemultiplexorExceptionSLL(message=f"Query error on slave #{n}", inst=None)
+                    return result
+            except Exception as inst:
+                CLogger.exception(inst, f"[READ] Slave #{n} {slave.db_info()} failed {method_name}. Try next.")
+                self._slave_health[n] = (time.monotonic(), False)
+            finally:
+                with self._read_lock:
+                    self._outstanding[n] -= 1
+        return self.call_master_method(method_name, *args, **kwargs)
+
+    def _read_candidates(self) -> list:
+        """
+        Номера слейвов пригодных для чтения в порядке попыток согласно read_policy
+        """
+        healthy = [n for n, _ in enumerate(self.slaves) if self._is_slave_healthy(n)]
+        if not healthy:
+            return []
+        with self._read_lock:
+            if self.read_policy == self.READ_LEAST_OUTSTANDING:
+                return sorted(healthy, key=lambda n: self._outstanding[n])
+            self._read_counter += 1
+            start = self._read_counter % len(healthy)
+        return healthy[start:] + healthy[:start]
+
+    def _is_slave_healthy(self, n: int) -> bool:
+        """
+        Проверка слейва (с кэшированием на health_check_interval sec): соединение открыто и лаг в пределах нормы
+        """
+        slave = self.slaves[n]
+        if not slave or not getattr(slave, "pool", None) and not (slave._db_connection and slave._db_connection.open):
+            return False
+        checked_at, healthy = self._slave_health[n]
+        if time.monotonic() - checked_at < self.health_check_interval:
+            return healthy
+        healthy = True
+        if self.max_replication_lag is not None:
+            with self._slave_locks[n] if not getattr(slave, "pool", None) else slave.worker_connection():
+                lag = slave.get_replication_lag()
+            healthy = lag is not None and lag <= self.max_replication_lag
+            if not healthy:
+                CLogger.warning(f"[READ] Slave #{n} {slave.db_info()} skipped. Replication lag: {lag} sec")
+        self._slave_health[n] = (time.monotonic(), healthy)
+        return healthy
+
     @sll_exception_catcher
     def call_master_method(self, method_name: str, *args, **kwargs):
         """
@@ -726,11 +2413,29 @@ class DemultiplexorDB:
         :return: [] result of method
         """
         methods = method if type(method) is list else [method for _ in self.slaves]
+        if self.parallel:
+            return self.slave_execute_parallel(methods, *args, **kwargs)
         result = []
         for i, _ in enumerate(self.slaves):
             result.append(self.slave_n_execute(i, methods[i], *args, **kwargs))
         return result
 
+    def slave_execute_parallel(self, method: any, *args, **kwargs):
+        """
+        !Внимание не безопасный метод на разнородных объектах!
+        Параллельное исполнение передаваемого метода на всех slave (not None) в пуле потоков.
+        Ошибка или таймаут (self.slave_timeout) одного слейва не прерывает остальные,
+        исключения по слейвам сохраняются в self.slave_errors (None - успешно).
+        :param method: объявление метода, который исполняем  н-р SLL.StatDB.select_data или массив методов
+        :param args: <tuple> неименнованные агрументы (кортеж)
+        :param kwargs: {} именнованные агрументы (словарь)
+        :return: [] result of method, порядок соответствует self.slaves (None - для слейвов с ошибкой)
+        """
+        methods = method if type(method) is list else [method for _ in self.slaves]
+        calls = [lambda i=i: self._slave_n_call(i, methods[i], *args, **kwargs) for i, _ in enumerate(self.slaves)]
+        result, self.slave_errors = self._run_parallel(calls, name="slave_execute", timeout=self.slave_timeout)
+        return result
+
     @sll_exception_catcher
     def slave_n_execute(self, n: int, method: any, *args, **kwargs):
         """
@@ -743,6 +2448,12 @@ class DemultiplexorDB:
         :param kwargs: {} именнованные агрументы (словарь)
         :return: [] result of method
         """
+        return self._slave_n_call(n, method, *args, **kwargs)
+
+    def _slave_n_call(self, n: int, method: any, *args, **kwargs):
+        """
+        Исполнение метода на n-м slave (может кидать исключения)
+        """
         slave = self.slaves[n] if self.slaves[n] else None
         if slave:
             method_list = [func for func in dir(slave) if callable(getattr(slave, func)) and not func.startswith("__")]
@@ -758,45 +2469,109 @@ class ProfLPDB(StatDB):
     Класс для работы с БД профайлов пользователей LP
     """
 
+    MAX_CNT_CRC_CHUNK = 5000  # Макс. кол-во crc в одном запросе 'crc IN (...)'
+    MIN_CNT_CRC_TEMP_TABLE = 200000  # С какого кол-ва crc выборка идет через временную таблицу (JOIN)
+
     def __init__(self,
                  db_config,
                  table,
                  fast_debug=False,
                  autocommit=True,
+                 pool=None,
+                 query_cache=None,
                  ):
-        StatDB.__init__(self, db_config=db_config, table=table, date=None, autocommit=autocommit, fast_debug=fast_debug)
+        StatDB.__init__(self, db_config=db_config, table=table, date=None, autocommit=autocommit, fast_debug=fast_debug,
+                        pool=pool, query_cache=query_cache)
 
-    def get_xml_for_crc_list(self, crc_list: []) -> dict:
+    def get_xml_for_crc_list(self, crc_list: [], chunk_size: int = None, workers: int = 0,
+                             temp_table: any = None) -> dict:
         """
-        Получить данные по юзерам которые в списке crc_list
-        :param crc_list:
-        :return:
+        Получить данные по юзерам которые в списке crc_list.
+        Повторяющиеся crc отбрасываются, список режется на пачки по chunk_size (запрос 'crc IN (%s,...)'),
+        пачки выполняются в workers потоках, у каждого потока свое соединение (worker_connection).
+        Для очень больших списков crc загружаются во временную таблицу и выбираются одним JOIN-ом.
+        :param crc_list: [] crc
+        :param chunk_size: кол-во crc в одном запросе (по умолчанию MAX_CNT_CRC_CHUNK)
+        :param workers: кол-во потоков (0, 1 - последовательно в текущем соединении)
+        :param temp_table: выборка через временную таблицу (None - если crc не меньше MIN_CNT_CRC_TEMP_TABLE)
+        :return: {} crc -> xml
         """
-        if not self.fast_debug:
-            result = self.select_data(columns=["crc", "xml"],
-                                      where=f"crc in ({(','.join((str(c) for c in crc_list)))})")
-        else:  # быстрая отладка грепаем 100 записей из БД
-            result = self.select_data(columns=["crc", "xml"],
-                                      where=f"crc in ({(','.join((str(c) for c in crc_list)))})",
-                                      limit='100')
+        crc_list = list(dict.fromkeys(crc_list))
         crc_xml = {}
-        try:
-            for r in result:
-                crc_xml[r[0]] = r[1]
-        except Exception as inst:
-            CLogger.exception(inst, "Error while reformat to dict")
+        if not crc_list:
+            return crc_xml
+        if self.fast_debug:  # быстрая отладка грепаем 100 записей из БД
+            crc_list = crc_list[:100]
+        if temp_table is None:
+            temp_table = len(crc_list) >= self.MIN_CNT_CRC_TEMP_TABLE
+        CLogger.info(f"{Color.Blue}SELECT{CLogger.infoColor} xml for {len(crc_list)} crc from {Color.Magenta}"
+                     f"{self.table} {Color.Blue}{self.db_info()}")
+        if temp_table:
+            return self._get_xml_for_crc_list_temp_table(crc_list)
 
+        chunk_size = chunk_size if chunk_size else self.MAX_CNT_CRC_CHUNK
+        chunks = [crc_list[i:i + chunk_size] for i in range(0, len(crc_list), chunk_size)]
+
+        def get_chunks(part):
+            for chunk in part:
+                rows = self.fetch_params(sql=f"SELECT crc, xml FROM `{self.table}` "
+                                             f"WHERE crc IN ({','.join(['%s'] * len(chunk))});",
+                                         args=chunk, silence=True)
+                if rows is None or rows[1] is None:
+                    raise DbCriticalExceptionSLL(message=f"Can't select xml for crc chunk ({len(chunk)} crc)! "
+                                                         f"{self.db_info()}", inst=None)
+                crc_xml.update(rows[0] or ())
+
+        workers = min(workers, len(chunks))
+        if workers > 1:
+            def get_chunks_worker(part):
+                with self.worker_connection():
+                    get_chunks(part)
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                # каждому потоку - своя часть пачек, чтобы соединение открывалось один раз на поток
+                list(executor.map(get_chunks_worker, (chunks[i::workers] for i in range(workers))))
+        else:
+            get_chunks(chunks)
+        return crc_xml
+
+    def _get_xml_for_crc_list_temp_table(self, crc_list: []) -> dict:
+        """
+        Выборка xml через временную таблицу: crc вставляются executemany (многострочные INSERT),
+        затем один запрос 'JOIN' читается потоково. Временная таблица живет в текущем соединении.
+        :param crc_list: [] уникальных crc
+        :return: {} crc -> xml
+        """
+        crc_xml = {}
+        with self.temporary_table(self.table, ["crc"], keys=["crc"]) as tmp_table:
+            if not self.execute(sql=f"INSERT INTO {tmp_table} (crc) VALUES (%s)",
+                                execute_many_data=[(c,) for c in crc_list], silence=True):
+                raise DbCriticalExceptionSLL(message=f"Can't fill temporary table {tmp_table}! {self.db_info()}",
+                                             inst=None)
+            self.stream_query(sql=f"SELECT p.crc, p.xml FROM `{self.table}` p JOIN {tmp_table} t ON t.crc = p.crc;",
+                              callback=crc_xml.update, silence=True)
         return crc_xml
 
-    def execute_callback_func_on_all_crc(self, callback: any) -> None:
+    def execute_callback_func_on_all_crc(self, callback: any, stream: bool = False, batch_size: int = None,
+                                         workers: int = 0) -> any:
         """
         Получить данные по всем юзерам в БД
         :param callback: функция колбэк
-        :return: None
+        :param stream: потоковый режим - таблица читается упорядоченно по crc небуферизированным курсором,
+        callback вызывается на каждую пачку строк (память не зависит от размера таблицы)
+        :param batch_size: размер пачки в потоковом режиме (по умолчанию MAX_CNT_STREAM_BATCH)
+        :param workers: кол-во потоков для callback в потоковом режиме (чтение идет параллельно с обработкой)
+        :return:
+            * Cnt<int> - кол-во обработанных строк (потоковый режим)
+            * None
         """
+        if stream:
+            limit = " LIMIT 100" if self.fast_debug else ""  # быстрая отладка грепаем 100 записей из БД
+            return self.stream_query(sql=f"SELECT crc, xml FROM `{self.table}` ORDER BY crc{limit};",
+                                     callback=callback, batch_size=batch_size, workers=workers)
         if not self.fast_debug:
             self.select_data(columns=["crc", "xml"],
-                             order_by='crc',
+                             keyset='crc',
                              callback=callback)
         else:  # быстрая отладка грепаем 100 записей из БД
             self.select_data(columns=["crc", "xml"],
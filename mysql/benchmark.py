@@ -0,0 +1,135 @@
+"""
+Микро-бенчмарки mysql модуля (без БД, на синтетических данных).
+Запуск из каталога, содержащего пакет: python -m <package>.mysql.benchmark
+"""
+import contextlib
+import datetime
+import json
+import logging
+import os
+import random
+import time
+
+from . import BaseMySQLDB, LogDB
+from .decoder import LogDecoder, orjson, ujson
+from ..logger import Logger, CLogger, QLogger, timer
+
+
+def make_log_records(n: int) -> list:
+    """
+    Синтетические строки log таблицы: (id, type, crc, json, time)
+    :param n: кол-во строк
+    :return: []<tuple>
+    """
+    start = datetime.datetime(2020, 3, 1)
+    records = []
+    for i in range(n):
+        t = (start + datetime.timedelta(seconds=random.randrange(86400))).strftime("%Y-%m-%d %H:%M:%S")
+        crc = random.randrange(1, n // 10 + 2)
+        d = {"crc": crc, "time": t, "event": random.randrange(100), "value": random.random(),
+             "platform": "web", "version": "1.2.3", "page": f"/page/{random.randrange(50)}"}
+        records.append((i, 1, crc, json.dumps(d), t))
+    return records
+
+
+def bench(name: str, func: any, records: list, repeat: int = 3) -> float:
+    """
+    Лучшее время из repeat запусков
+    :return: время sec
+    """
+    best = min(_run(func, records) for _ in range(repeat))
+    print(f"{name:<40} {best:8.3f} sec  {len(records) / best:12,.0f} rows/sec")
+    return best
+
+
+def _run(func: any, records: list) -> float:
+    start_time = time.perf_counter()
+    func(records)
+    return time.perf_counter() - start_time
+
+
+def bench_log_decoder(n: int = 200000) -> None:
+    """
+    Сравнение LogDB.process_log_data (json + strptime) и LogDecoder
+    :param n: кол-во строк
+    """
+    records = make_log_records(n)
+    assert LogDB.process_log_data(records[:1000]) == LogDecoder(json_backend="json").decode(records[:1000])
+    base = bench("LogDB.process_log_data", LogDB.process_log_data, records)
+    for backend in ("json", "ujson" if ujson else None, "orjson" if orjson else None):
+        if backend:
+            best = bench(f"LogDecoder({backend})", LogDecoder(json_backend=backend).decode, records)
+            print(f"{'':<40} x{base / best:.2f}")
+            best = bench(f"LogDecoder({backend}, fields=[event])",
+                         LogDecoder(fields=["event"], json_backend=backend).decode, records)
+            print(f"{'':<40} x{base / best:.2f}")
+
+
+class _NullCursor:
+    """
+    Курсор без БД: запросы ничего не делают (измеряется только накладной расход _execute)
+    """
+    lastrowid = None
+
+    def execute(self, sql, args=None):
+        pass
+
+    def executemany(self, sql, data):
+        pass
+
+
+@contextlib.contextmanager
+def _devnull_logger():
+    """
+    Вывод лога в /dev/null (форматирование записей сохраняется, в терминал ничего не пишется)
+    """
+    handlers, level = Logger.handlers[:], Logger.level
+    with open(os.devnull, "w") as devnull:
+        Logger.handlers = [logging.StreamHandler(devnull)]
+        Logger.setLevel(logging.DEBUG)
+        try:
+            yield
+        finally:
+            Logger.handlers = handlers
+            Logger.setLevel(level)
+            QLogger.config()
+            CLogger.debug_info_on = True
+
+
+def bench_query_log(n: int = 100000) -> None:
+    """
+    Накладной расход логирования запросов в BaseMySQLDB._execute и декоратора timer на один вызов
+    :param n: кол-во запросов
+    """
+    db = BaseMySQLDB(db_config={"host": "localhost", "port": 3306, "user": "", "pass": "", "name_db": "bench"})
+    cursor = _NullCursor()
+    sql = "INSERT INTO stat (crc, cnt, value) VALUES (%s, %s, %s) ON DUPLICATE KEY UPDATE cnt=cnt+1;"
+    records = [(i, 1, "value") for i in range(n)]
+
+    def run_execute(silence):
+        return lambda rows: [db._execute(cursor=cursor, sql=sql, silence=silence, args=r) for r in rows]
+
+    with _devnull_logger():
+        CLogger.debug_info_on = False  # только лог запросов, без debug строк timer
+        base = bench("_execute silence=True", run_execute(True), records)
+        cases = [("QLogger on", {}), ("QLogger on, max_len_sql=40", {"max_len_sql": 40}),
+                 ("QLogger sample_rate=0.01", {"sample_rate": 0.01}), ("QLogger off", {"enabled": False})]
+        for name, config in cases:
+            QLogger.config(**config)
+            best = bench(f"_execute {name}", run_execute(False), records)
+            print(f"{'':<40} +{(best - base) / n * 1e6:.2f} us/query")
+        QLogger.config()
+
+        @timer
+        def noop(_):
+            pass
+
+        base = bench("no decorator", lambda rows: [None for r in rows], records)
+        for debug_info_on in (True, False):
+            CLogger.debug_info_on = debug_info_on
+            best = bench(f"@timer debug_info_on={debug_info_on}", lambda rows: [noop(r) for r in rows], records)
+            print(f"{'':<40} +{(best - base) / n * 1e6:.2f} us/call")
+
+if __name__ == "__main__":
+    bench_log_decoder()
+    bench_query_log()
@@ -0,0 +1,129 @@
+import collections
+import re
+import sys
+import threading
+import time
+
+
+class QueryCache:
+    """
+    In-process LRU кэш результатов запросов с TTL и ограничением по памяти.
+    Ключ - нормализованный sql (схлопнутые пробелы), запись помечается таблицами для инвалидации при записи.
+    Внимание! Закэшированный результат отдается как есть - его нельзя модифицировать.
+    """
+
+    __slots__ = ('max_entries', 'max_bytes', 'ttl', '_entries', '_tables', '_lock', '_bytes',
+                 'hits', 'misses', 'evictions', 'expirations', 'invalidations')
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024, ttl: float = 300):
+        """
+        :param max_entries: макс. кол-во записей
+        :param max_bytes: макс. суммарный (оценочный) размер результатов в байтах
+        :param ttl: время жизни записи sec
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()  # key -> (expire_at, size, tables, value)
+        self._tables = collections.defaultdict(set)  # table -> {key}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    RE_WHITESPACE = re.compile(r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")|\s+""")
+
+    @staticmethod
+    def normalize(sql: str) -> str:
+        """
+        Схлопнуть пробельные символы вне строковых литералов
+        """
+        return QueryCache.RE_WHITESPACE.sub(lambda m: m.group(1) or " ", sql).strip().rstrip(";").rstrip()
+
+    @staticmethod
+    def sizeof(value: any) -> int:
+        """
+        Оценка размера результата (список строк-кортежей) в байтах
+        """
+        size = sys.getsizeof(value)
+        if isinstance(value, (list, tuple)):
+            for row in value:
+                size += sys.getsizeof(row)
+                if isinstance(row, (list, tuple)):
+                    size += sum(sys.getsizeof(v) for v in row)
+        return size
+
+    def get(self, sql: str) -> (bool, any):
+        """
+        :param sql: запрос
+        :return: (True, результат) - попадание; (False, None) - промах
+        """
+        key = self.normalize(sql)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, entry[3]
+                self._remove(key)
+                self.expirations += 1
+            self.misses += 1
+            return False, None
+
+    def put(self, sql: str, value: any, tables: any = ()) -> None:
+        """
+        :param sql: запрос
+        :param value: результат
+        :param tables: таблицы запроса (для инвалидации)
+        """
+        key = self.normalize(sql)
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, tuple(tables), value)
+            self._bytes += size
+            for table in tables:
+                self._tables[table].add(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, table: str) -> None:
+        """
+        Удалить все записи, помеченные таблицей
+        """
+        with self._lock:
+            for key in list(self._tables.pop(table, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tables.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "expirations": self.expirations, "invalidations": self.invalidations}
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+            for table in entry[2]:
+                keys = self._tables.get(table)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._tables[table]
@@ -0,0 +1,313 @@
+import array
+import decimal
+import sys
+
+from pymysql.constants import FIELD_TYPE
+
+try:  # опционально: быстрая сортировка и компактные срезы
+    import numpy
+except ImportError:
+    numpy = None
+try:  # опционально: Arrow таблицы (ResultColumns.to_arrow)
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+class LogColumns:
+    """
+    Компактное колоночное представление логов, сгруппированных по crc (альтернатива {} crc -> [] of {}).
+    Каждое поле события хранится одной колонкой: int/float - типизированный array, строки - список
+    интернированных строк, прочее - список объектов. NumPy (если установлен) используется для группировки.
+    Пользователи индексируются по crc смещением и кол-вом событий в колонках, словари событий не хранятся.
+
+    Использование:
+        columns = LogColumns()
+        columns.extend(decoded_batch)  # сколько угодно раз
+        columns.freeze()               # группировка по crc
+        for crc, events in columns.items(): ...
+    """
+
+    __slots__ = ('fields', '_columns', '_index', '_size', '_fixed_fields')
+
+    TYPECODES = {int: "q", float: "d"}  # bool хранится списком, чтобы не превратиться в 0/1
+
+    def __init__(self, fields: any = None):
+        """
+        :param fields: [] полей (None - все встреченные поля, первым всегда crc)
+        """
+        self.fields = ["crc"] + [f for f in fields if f != "crc"] if fields else ["crc"]
+        self._columns = {f: None for f in self.fields}
+        self._index = {}  # crc -> (offset, count) после freeze()
+        self._size = 0
+        self._fixed_fields = fields is not None  # при заданных полях новые поля не добавляются
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __contains__(self, crc):
+        return crc in self._index
+
+    def __getitem__(self, crc):
+        """
+        События пользователя в старом формате: [] of {}
+        """
+        return list(self.events(crc))
+
+    @property
+    def cnt_events(self) -> int:
+        return self._size
+
+    def keys(self):
+        return self._index.keys()
+
+    def items(self):
+        """
+        Пары (crc, [] of {}) как у словаря, события материализуются по одному пользователю
+        """
+        for crc in self._index:
+            yield crc, self[crc]
+
+    def events(self, crc):
+        """
+        Генератор событий пользователя (словари создаются на лету)
+        """
+        offset, count = self._index[crc]
+        columns = [(f, self._columns[f]) for f in self.fields]
+        for i in range(offset, offset + count):
+            yield {f: c[i] for f, c in columns if c[i] is not None or f == "crc"}
+
+    def column(self, crc, field):
+        """
+        Значения одного поля для пользователя (срез колонки без создания словарей)
+        """
+        offset, count = self._index[crc]
+        return self._columns[field][offset:offset + count]
+
+    def extend(self, records: list) -> None:
+        """
+        Добавить разобранные события (словари с ключом crc)
+        :param records: [] of {}
+        """
+        for d in records:
+            if not self._fixed_fields:
+                for f in d:
+                    if f not in self._columns:
+                        self.fields.append(f)
+                        self._columns[f] = [None] * self._size
+            for f in self.fields:
+                self._append(f, d.get(f))
+            self._size += 1
+
+    def _append(self, field, value):
+        column = self._columns[field]
+        if column is None:  # тип колонки определяется первым значением
+            column = self._new_column(value, self._size)
+            self._columns[field] = column
+        if isinstance(column, array.array):
+            try:
+                if value is None or isinstance(value, str):
+                    raise TypeError
+                column.append(value)
+                return
+            except (TypeError, OverflowError):  # значение не влезает в тип - колонка становится списком
+                column = list(column)
+                self._columns[field] = column
+        column.append(sys.intern(value) if isinstance(value, str) else value)
+
+    def _new_column(self, value, size):
+        typecode = self.TYPECODES.get(type(value)) if size == 0 else None
+        return array.array(typecode) if typecode else [None] * size
+
+    def freeze(self) -> 'LogColumns':
+        """
+        Сгруппировать события по crc (стабильная сортировка, порядок событий пользователя сохраняется)
+        :return: self
+        """
+        crc = self._columns["crc"]
+        if crc is None:
+            return self
+        if numpy is not None and isinstance(crc, array.array):
+            order = numpy.argsort(numpy.frombuffer(crc, dtype=crc.typecode), kind="stable")
+        else:
+            order = sorted(range(self._size), key=crc.__getitem__)
+        for f, column in self._columns.items():
+            if isinstance(column, array.array):
+                if numpy is not None:
+                    ordered = numpy.frombuffer(column, dtype=column.typecode)[order]
+                    self._columns[f] = array.array(column.typecode, ordered.tobytes())
+                else:
+                    self._columns[f] = array.array(column.typecode, (column[i] for i in order))
+            elif column is not None:
+                self._columns[f] = [column[i] for i in order]
+        crc = self._columns["crc"]
+        self._index = {}
+        offset = 0
+        while offset < self._size:
+            key = crc[offset]
+            end = offset + 1
+            while end < self._size and crc[end] == key:
+                end += 1
+            self._index[key] = (offset, end - offset)
+            offset = end
+        return self
+
+
+class ResultColumns:
+    """
+    Результат запроса по колонкам (вместо списка tuple): тип колонки берется из cursor.description.
+    Целые - array 'q' (UNSIGNED - 'Q'), дробные и DECIMAL - array 'd' (DECIMAL теряет точность), прочее - список
+    объектов.
+    NULL в числовой колонке хранится как 0 + маска (создается при первом NULL).
+    Заполняется пачками строк по мере потокового чтения (extend), по 8 байт на числовую ячейку.
+
+    Использование:
+        columns = db.fetch_columns("SELECT crc, cnt FROM stat;")
+        columns["cnt"]       # numpy.ndarray (если установлен numpy), иначе array.array
+        columns.to_arrow()   # pyarrow.Table (если установлен pyarrow)
+    """
+
+    __slots__ = ('names', '_columns', '_masks', '_size')
+
+    INT_TYPES = frozenset((FIELD_TYPE.TINY, FIELD_TYPE.SHORT, FIELD_TYPE.LONG, FIELD_TYPE.LONGLONG, FIELD_TYPE.INT24,
+                           FIELD_TYPE.YEAR))
+    FLOAT_TYPES = frozenset((FIELD_TYPE.FLOAT, FIELD_TYPE.DOUBLE, FIELD_TYPE.DECIMAL, FIELD_TYPE.NEWDECIMAL))
+    DATETIME_TYPES = {FIELD_TYPE.DATETIME: "datetime64[us]", FIELD_TYPE.TIMESTAMP: "datetime64[us]",
+                      FIELD_TYPE.DATE: "datetime64[D]"}
+
+    def __init__(self, description: any, unsigned: any = None):
+        """
+        :param description: cursor.description ((name, type_code, ...), ...)
+        :param unsigned: [] признаков UNSIGNED колонок (cursor.description флагов не содержит), None - все знаковые
+        """
+        self.names = [d[0] for d in description]
+        unsigned = unsigned if unsigned else [False] * len(description)
+        self._columns = [array.array("Q" if is_unsigned else "q") if d[1] in self.INT_TYPES else
+                         array.array("d") if d[1] in self.FLOAT_TYPES else
+                         _ObjectColumn(self.DATETIME_TYPES.get(d[1])) for d, is_unsigned in zip(description, unsigned)]
+        self._masks = [None] * len(description)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __getitem__(self, name):
+        return self._column(self.names.index(name))
+
+    def keys(self):
+        return list(self.names)
+
+    def mask(self, name) -> any:
+        """
+        Маска NULL числовой колонки (array 'b', 1 - NULL) или None, если NULL не было
+        """
+        return self._masks[self.names.index(name)]
+
+    def items(self):
+        for i, name in enumerate(self.names):
+            yield name, self._column(i)
+
+    def extend(self, rows: list) -> None:
+        """
+        Добавить пачку строк
+        :param rows: []<tuple> в порядке cursor.description
+        """
+        if not rows:
+            return
+        for i, column in enumerate(self._columns):
+            values = [r[i] for r in rows]
+            if isinstance(column, array.array):
+                numbers = values
+                if None in values or self._masks[i] is not None:
+                    numbers = [0 if v is None else v for v in values]
+                try:
+                    column.extend([float(v) if isinstance(v, decimal.Decimal) else v for v in numbers])
+                except (TypeError, OverflowError):  # значение не влезает в тип - колонка становится списком
+                    column = self._to_objects(i)
+                else:
+                    if numbers is not values:
+                        mask = self._masks[i]
+                        if mask is None:
+                            mask = self._masks[i] = array.array("b", bytes(self._size))
+                        mask.extend([v is None for v in values])
+                    continue
+            column.extend(values)
+        self._size += len(rows)
+
+    def _to_objects(self, i: int) -> '_ObjectColumn':
+        """
+        Перевести колонку в список объектов (NULL восстанавливаются по маске)
+        """
+        column, mask = self._columns[i], self._masks[i]
+        values = list(column[:self._size])
+        if mask is not None:
+            values = [None if m else v for v, m in zip(values, mask)]
+        self._columns[i] = _ObjectColumn(None, values)
+        self._masks[i] = None
+        return self._columns[i]
+
+    def _column(self, i: int) -> any:
+        """
+        Колонка: numpy.ndarray (masked, если были NULL) при установленном numpy, иначе array.array или list
+        """
+        column, mask = self._columns[i], self._masks[i]
+        if numpy is None:
+            return column.values if isinstance(column, _ObjectColumn) else column
+        if isinstance(column, _ObjectColumn):
+            return numpy.array(column.values, dtype=column.dtype if column.dtype else object)
+        values = numpy.frombuffer(column, dtype=column.typecode) if len(column) else \
+            numpy.array([], dtype=column.typecode)
+        if mask is not None:
+            return numpy.ma.masked_array(values, mask=numpy.frombuffer(mask, dtype=numpy.int8).astype(bool))
+        return values
+
+    def to_numpy(self) -> dict:
+        """
+        :return: {} имя колонки -> numpy.ndarray
+        """
+        if numpy is None:
+            raise ImportError("numpy is not installed")
+        return dict(self.items())
+
+    def to_arrow(self) -> any:
+        """
+        :return: pyarrow.Table
+        """
+        if pyarrow is None:
+            raise ImportError("pyarrow is not installed")
+        arrays = []
+        for i, column in enumerate(self._columns):
+            if isinstance(column, _ObjectColumn):
+                arrays.append(pyarrow.array(column.values))
+            else:
+                mask = self._masks[i]
+                arrays.append(pyarrow.array(numpy.frombuffer(column, dtype=column.typecode), mask=None if mask is None
+                                            else numpy.frombuffer(mask, dtype=numpy.int8).astype(bool)))
+        return pyarrow.Table.from_arrays(arrays, names=self.names)
+
+
+class _ObjectColumn:
+    """
+    Колонка объектов (строки, даты, прочее); dtype - numpy тип для дат
+    """
+
+    __slots__ = ('dtype', 'values')
+
+    def __init__(self, dtype: any = None, values: list = None):
+        self.dtype = dtype
+        self.values = values if values is not None else []
+
+    def __len__(self):
+        return len(self.values)
+
+    def extend(self, values: list) -> None:
+        self.values.extend(sys.intern(v) if isinstance(v, str) else v for v in values)
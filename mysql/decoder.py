@@ -0,0 +1,101 @@
+import datetime
+import json
+
+from ..logger import DbCriticalExceptionSLL
+from .. import other
+
+try:  # опциональные быстрые json бэкенды
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class LogDecoder:
+    """
+    Быстрый декодер строк log таблиц (замена LogDB.process_log_data).
+        * json - orjson/ujson если установлены, иначе стандартный json
+        * time - разбор фиксированного формата '%Y-%m-%d %H:%M:%S' без strptime, timestamp часа кэшируется
+        * fields - проекция: в результирующих словарях остаются только нужные ключи (+ crc и time)
+    """
+
+    __slots__ = ('fields', 'json_backend', '_loads', '_hour_cache')
+
+    MAX_CNT_HOUR_CACHE = 10000  # Макс. кол-во часов в кэше timestamp-ов
+
+    def __init__(self, fields: any = None, json_backend: any = None):
+        """
+        :param fields: [] ключей которые нужно оставить (None - все ключи)
+        :param json_backend: 'orjson', 'ujson', 'json' или None - самый быстрый из установленных
+        """
+        self.fields = frozenset(fields) | {"crc", "time"} if fields else None
+        self.json_backend = json_backend if json_backend else "orjson" if orjson else "ujson" if ujson else "json"
+        self._loads = self.json_loads(self.json_backend)
+        self._hour_cache = {}
+
+    def __getstate__(self):
+        return self.fields, self.json_backend
+
+    def __setstate__(self, state):
+        self.fields, self.json_backend = state
+        self._loads = self.json_loads(self.json_backend)
+        self._hour_cache = {}
+
+    @staticmethod
+    def json_loads(json_backend: str) -> any:
+        """
+        Функция json.loads выбранного бэкенда
+        :param json_backend: 'orjson', 'ujson', 'json'
+        :return: функция loads
+        """
+        if json_backend == "orjson" and orjson:
+            return orjson.loads
+        if json_backend == "ujson" and ujson:
+            return ujson.loads
+        if json_backend == "json":
+            return json.loads
+        raise DbCriticalExceptionSLL(message=f"JSON backend {json_backend!r} is not installed!", inst=None)
+
+    def parse_time(self, value: str) -> int:
+        """
+        'YYYY-MM-DD HH:MM:SS' (локальное время) -> unix timestamp, аналог int(strptime(...).timestamp())
+        :param value: строка времени
+        :return: timestamp
+        """
+        hour = value[:13]
+        base = self._hour_cache.get(hour)
+        if base is None:
+            if len(self._hour_cache) >= self.MAX_CNT_HOUR_CACHE:
+                self._hour_cache.clear()
+            base = int(datetime.datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                                         int(value[11:13])).timestamp())
+            self._hour_cache[hour] = base
+        return base + int(value[14:16]) * 60 + int(value[17:19])
+
+    def decode(self, records: any) -> list:
+        """
+        Предобработка данных логов из БД log
+        :param records: [] tuple
+        :return: [] of {}
+        """
+        result = []
+        loads = self._loads
+        parse_time = self.parse_time
+        fields = self.fields
+        r = None
+        try:
+            for r in records:
+                d = loads(r[3])
+                if "crc" not in d:
+                    continue
+                if fields is not None:
+                    d = {k: v for k, v in d.items() if k in fields}
+                d["time"] = parse_time(d["time"])
+                result.append(d)
+            return result
+        except Exception as inst_parse_log_data:
+            raise DbCriticalExceptionSLL(message=f"Error in func {other.who_am_i()!r}. While parse log data {r}",
+                                         inst=inst_parse_log_data)
@@ -0,0 +1,230 @@
+import collections
+import contextlib
+import threading
+import time
+import pymysql
+
+from ..logger import DbCriticalExceptionSLL, CLogger, Color
+
+
+class MySQLConnectionPool:
+    """
+    Потокобезопасный пул соединений MySQL.
+    Соединения выдаются через контекстный менеджер connection(), при выдаче проверяются ping-ом,
+    соединения простаивающие дольше idle_timeout закрываются (но не меньше min_size открытых).
+    """
+
+    def __init__(self,
+                 db_config: dict,
+                 min_size: int = 1,
+                 max_size: int = 10,
+                 idle_timeout: float = 300,
+                 checkout_timeout: float = 60,
+                 auto_commit: bool = True,
+                 charset: any = None,  # latin-1, utf8, utf8mb4
+                 local_infile: int = 0):
+        self.db_host = db_config["host"]
+        self.db_port = db_config["port"]
+        self.db_user = db_config["user"]
+        self.db_pass = db_config["pass"]
+        self.db_name = db_config["name_db"]
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.autocommit = auto_commit
+        self.charset = charset
+        self.local_infile = local_infile
+        self._idle = collections.deque()  # (connection, время возврата в пул)
+        self._cnt_open = 0  # всего открытых соединений (свободных и выданных)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.cnt_created = 0
+        self.cnt_checkout = 0
+        self.cnt_recycled = 0
+        self.cnt_ping_fail = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, type_e, value_e, traceback_e):
+        self.close()
+
+    def db_info(self) -> str:
+        return f"{self.db_host}:{self.db_port}/{self.db_name}"
+
+    def open(self) -> None:
+        """
+        Открыть min_size соединений заранее
+        :return: None
+        """
+        with self._cond:
+            self._closed = False
+            cnt_missing = self.min_size - self._cnt_open
+            self._cnt_open += max(cnt_missing, 0)
+        for _ in range(cnt_missing):
+            self._release_new(self._create())
+        CLogger.info(f"[POOL] Pool to DB: {Color.Blue}{self.db_info()}. {Color.Light_Green}OPENED! "
+                     f"{CLogger.infoColor}(min={self.min_size}, max={self.max_size})")
+
+    def close(self) -> None:
+        """
+        Закрыть все свободные соединения, выданные закроются при возврате
+        :return: None
+        """
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, collections.deque()
+            self._cnt_open -= len(idle)
+            self._cond.notify_all()
+        for connection, _ in idle:
+            self._close(connection)
+        CLogger.info(f"[POOL] Pool to DB: {Color.Blue}{self.db_info()}. {Color.Light_Red}CLOSED!")
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        Взять соединение из пула на время блока with
+        :return: pymysql.Connection
+        """
+        connection = self.acquire()
+        try:
+            yield connection
+        except Exception:
+            self.release(connection, discard=not connection.open)
+            raise
+        else:
+            self.release(connection)
+
+    def acquire(self) -> any:
+        """
+        Взять соединение из пула (ждет не дольше checkout_timeout, если все max_size соединений выданы)
+        :return: pymysql.Connection
+        """
+        deadline = time.monotonic() + self.checkout_timeout if self.checkout_timeout else None
+        while True:
+            connection = None
+            with self._cond:
+                if self._closed:
+                    raise DbCriticalExceptionSLL(message=f"Pool is closed! {self.db_info()}", inst=None)
+                expired = self._pop_expired()
+                if self._idle:
+                    connection = self._idle.pop()[0]  # LIFO - самое "теплое" соединение
+                elif self._cnt_open < self.max_size:
+                    self._cnt_open += 1
+                else:
+                    timeout = deadline - time.monotonic() if deadline else None
+                    if timeout is not None and timeout <= 0:
+                        raise DbCriticalExceptionSLL(message=f"Pool checkout timeout {self.checkout_timeout} sec! "
+                                                             f"All {self.max_size} connections busy. {self.db_info()}",
+                                                     inst=None)
+                    self._cond.wait(timeout)
+                    continue
+            for c in expired:
+                self._close(c)
+            connection = self._checkout(connection) if connection else self._create()
+            self.cnt_checkout += 1
+            return connection
+
+    def release(self, connection: any, discard: bool = False) -> None:
+        """
+        Вернуть соединение в пул
+        :param connection: соединение
+        :param discard: закрыть соединение, а не возвращать (например, после ошибки сети)
+        :return: None
+        """
+        if not discard and not (self.autocommit and connection.get_autocommit()):
+            try:
+                connection.rollback()  # незакоммиченная транзакция не должна достаться следующему потоку
+            except Exception as inst:
+                CLogger.exception(inst, f"[POOL] Rollback on release failed. {self.db_info()}")
+                discard = True
+        with self._cond:
+            if discard or self._closed:
+                self._cnt_open -= 1
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._cond.notify()
+        if discard or self._closed:
+            self._close(connection)
+
+    def stats(self) -> dict:
+        """
+        Статистика пула
+        :return: {}
+        """
+        with self._cond:
+            return {"open": self._cnt_open, "idle": len(self._idle), "created": self.cnt_created,
+                    "checkout": self.cnt_checkout, "recycled": self.cnt_recycled, "ping_fail": self.cnt_ping_fail}
+
+    def _release_new(self, connection: any) -> None:
+        with self._cond:
+            self._idle.append((connection, time.monotonic()))
+            self._cond.notify()
+
+    def _pop_expired(self) -> list:
+        """
+        Забрать из пула соединения простаивающие дольше idle_timeout (вызывать под self._cond)
+        :return: [] соединений для закрытия
+        """
+        expired = []
+        if self.idle_timeout:
+            now = time.monotonic()
+            # слева самые давно вернувшиеся соединения
+            while self._idle and self._cnt_open > self.min_size and now - self._idle[0][1] > self.idle_timeout:
+                expired.append(self._idle.popleft()[0])
+                self._cnt_open -= 1
+                self.cnt_recycled += 1
+        return expired
+
+    def _checkout(self, connection: any) -> any:
+        """
+        Проверка соединения перед выдачей: ping (с переподключением) и восстановление autocommit
+        :param connection: соединение из пула
+        :return: живое соединение
+        """
+        try:
+            connection.ping(reconnect=False)
+        except Exception as inst:
+            self.cnt_ping_fail += 1
+            CLogger.exception(inst, f"[POOL] Ping failed, reconnect. {self.db_info()}")
+            self._close(connection)
+            return self._create()
+        if connection.get_autocommit() != self.autocommit:
+            connection.autocommit(self.autocommit)
+        return connection
+
+    def _create(self) -> any:
+        """
+        Открыть новое соединение с настройками пула
+        :return: pymysql.Connection
+        """
+        try:
+            connection = pymysql.connect(host=self.db_host,
+                                         port=int(self.db_port),
+                                         user=self.db_user,
+                                         passwd=self.db_pass,
+                                         db=self.db_name,
+                                         autocommit=self.autocommit,
+                                         local_infile=self.local_infile)
+            if self.charset:
+                connection.set_charset(self.charset)
+                with connection.cursor() as cursor:
+                    cursor.execute(f"SET NAMES {self.charset};")
+                    cursor.execute(f"SET CHARACTER SET {self.charset};")
+                    cursor.execute(f"SET character_set_connection={self.charset};")
+        except Exception as inst:
+            with self._cond:
+                self._cnt_open -= 1
+                self._cond.notify()
+            raise DbCriticalExceptionSLL(message=f"Pool can't connect to DB: {self.db_info()}", inst=inst)
+        self.cnt_created += 1
+        return connection
+
+    @staticmethod
+    def _close(connection: any) -> None:
+        try:
+            connection.close()
+        except Exception:
+            pass  # соединение уже разорвано
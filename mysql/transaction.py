@@ -0,0 +1,72 @@
+import time
+
+
+class Transaction:
+    """
+    Состояние транзакции BaseMySQLDB.transaction(): счетчики запросов/байт с последнего commit (group commit)
+    и итоговая статистика блока.
+    """
+
+    __slots__ = ('max_statements', 'max_bytes', 'cnt_statements', 'cnt_bytes', 'total_statements', 'total_bytes',
+                 'commits', 'rollbacks', 'failed', 'start_time', 'end_time')
+
+    def __init__(self, max_statements: int = 0, max_bytes: int = 0):
+        """
+        :param max_statements: commit после стольких запросов (0 - только в конце блока)
+        :param max_bytes: commit после стольких отправленных байт (0 - только в конце блока)
+        """
+        self.max_statements = max_statements
+        self.max_bytes = max_bytes
+        self.cnt_statements = 0
+        self.cnt_bytes = 0
+        self.total_statements = 0
+        self.total_bytes = 0
+        self.commits = 0
+        self.rollbacks = 0
+        self.failed = False  # в блоке был запрос с ошибкой - в конце блока будет rollback
+        self.start_time = time.perf_counter()
+        self.end_time = None
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+    def add(self, cnt_bytes: int = 0) -> bool:
+        """
+        Учесть запрос
+        :param cnt_bytes: отправлено байт
+        :return: True - пора делать промежуточный commit
+        """
+        self.cnt_statements += 1
+        self.cnt_bytes += cnt_bytes
+        self.total_statements += 1
+        self.total_bytes += cnt_bytes
+        return not self.failed and (self.max_statements and self.cnt_statements >= self.max_statements or
+                                    self.max_bytes and self.cnt_bytes >= self.max_bytes)
+
+    def committed(self) -> None:
+        self.commits += 1
+        self.cnt_statements = 0
+        self.cnt_bytes = 0
+
+    def rolled_back(self) -> None:
+        self.rollbacks += 1
+        self.cnt_statements = 0
+        self.cnt_bytes = 0
+
+    def finish(self) -> None:
+        self.end_time = time.perf_counter()
+
+    @property
+    def duration(self) -> float:
+        return (self.end_time if self.end_time else time.perf_counter()) - self.start_time
+
+    @property
+    def commits_per_sec(self) -> float:
+        return self.commits / self.duration if self.duration > 0 else 0.0
+
+    def stats(self) -> dict:
+        return {"statements": self.total_statements, "bytes": self.total_bytes, "commits": self.commits,
+                "rollbacks": self.rollbacks, "failed": self.failed, "duration": self.duration,
+                "commits_per_sec": self.commits_per_sec,
+                "statements_per_sec": self.total_statements / self.duration if self.duration > 0 else 0.0}
@@ -2,8 +2,10 @@ import psycopg2
 import time
 
 from ..logger import DbCriticalExceptionSLL, DbSqlQueryExceptionSLL, unknown_exception_catcher, sll_exception_catcher, timer
-from ..logger import Color, Logger, CLogger
+from ..logger import Color, Logger, CLogger, QLogger
 from .. import other
+from ..metrics import Metrics
+from ..export import ResultExporter
 
 
 class BasePostgresDB:
@@ -16,6 +18,13 @@ class BasePostgresDB:
     MAX_CNT_EXECUTEMANY_DATA = 25000  # Макс. кол-во данных в одном executemany запросе
     MAX_CNT_FETCH_ALL = 100000  # Макс. кол-во строк получаемых из одного запроса fetchall
     MAX_CNT_VIEW_LOG_DATA = 10  # Макс. кол-во строк для отображения данных в логировании запросов
+    MAX_CNT_STREAM_BATCH = 10000  # Кол-во строк в одной пачке при потоковом чтении (серверный курсор)
+    # OID типов postgres -> типы колонок выгрузки export_query (numeric - по точности в _export_types,
+    # остальные - по данным)
+    EXPORT_TYPES = {16: "bool", 17: "binary", 18: "string", 19: "string", 20: "int", 21: "int", 23: "int",
+                    25: "string", 700: "float", 701: "float", 1042: "string", 1043: "string", 1082: "date",
+                    1083: "time", 1114: "timestamp", 1184: "timestamp", 1186: "duration", 2950: "string"}
+    NUMERIC_OID = 1700
 
     _db_connection = None
     _timeout_reconnect_db = 10  # Таймаут попыток переподключится к БД 1 sec
@@ -117,14 +126,21 @@ class BasePostgresDB:
         try:
             with self._db_connection.cursor() as cursor:
                 if cursor:
-                    CLogger.printc(f"\tExecute sql query:\n"
-                                   f"\t\t{Color.Light_Cyan}{sql}", color=Color.Yellow)
+                    if QLogger.is_enabled():
+                        QLogger.log(sql, db_info=self.db_info())
+                    start_time = time.perf_counter()
                     try:
                         cursor.execute(sql)
                         for r in cursor.fetchall():
                             result.append(r)
+                        if Metrics.enabled:
+                            Metrics.record("postgres", sql, time.perf_counter() - start_time, rows=len(result),
+                                           bytes_sent=len(sql))
                         return result
                     except Exception as inst:
+                        if Metrics.enabled:
+                            Metrics.record("postgres", sql, time.perf_counter() - start_time, bytes_sent=len(sql),
+                                           error=True)
                         raise DbSqlQueryExceptionSLL(
                             db_info=self.db_info(),
                             sql=sql,
@@ -150,11 +166,18 @@ class BasePostgresDB:
         try:
             with self._db_connection.cursor() as cursor:
                 if cursor:
-                    CLogger.printc(f"\tExecute sql query:\n"
-                                   f"\t\t{Color.Light_Cyan}{sql}", color=Color.Yellow)
+                    if QLogger.is_enabled():
+                        QLogger.log(sql, db_info=self.db_info())
+                    start_time = time.perf_counter()
                     try:
                         cursor.execute(sql)
+                        if Metrics.enabled:
+                            Metrics.record("postgres", sql, time.perf_counter() - start_time,
+                                           rows=max(cursor.rowcount, 0), bytes_sent=len(sql))
                     except Exception as inst:
+                        if Metrics.enabled:
+                            Metrics.record("postgres", sql, time.perf_counter() - start_time, bytes_sent=len(sql),
+                                           error=True)
                         Logger.error("{c} Error while execute() work with cursor."
                                      "Exception:{exc}. DB_NAME:{name_db} SQL:{SQL} {r}"
                                      .format(exc=inst, name_db=self.db_config["database"], SQL=sql, c=Color.Cyan,
@@ -164,3 +187,70 @@ class BasePostgresDB:
                     self.connect()
         except Exception as inst:
             raise DbCriticalExceptionSLL(message=f"Unknown Error!", inst=inst)
+
+    def _export_types(self, description: any) -> list:
+        """
+        Типы колонок выгрузки (ResultExporter) по cursor.description: numeric(p, s) - ('decimal', p, s),
+        numeric без точности - 'string'
+        :param description: cursor.description
+        :return: [] типов в порядке description
+        """
+        return [(("decimal", d[4], d[5] or 0) if d[4] else "string") if d[1] == self.NUMERIC_OID else
+                self.EXPORT_TYPES.get(d[1]) for d in description]
+
+    @unknown_exception_catcher
+    @sll_exception_catcher
+    @timer
+    def export_query(self, path: str, sql: str = None, sql_template: str = None, fmt: str = None,
+                     compression: str = None, batch_size: int = None, row_group_size: int = None) -> any:
+        """
+        Потоковая выгрузка результата запроса в файл CSV или Parquet (ResultExporter): строки читаются
+        серверным (именованным) курсором пачками и сразу пишутся в файл, память ограничена пачкой/row group.
+        Внимание! Если sql_template есть, то берется он, в противном случае берется sql.
+        :param path: путь к файлу (.csv, .csv.gz, .csv.bz2, .csv.xz, .parquet)
+        :param sql: готовый sql запрос
+        :param sql_template: шаблон запроса к БД
+        :param fmt: 'csv' или 'parquet' (None - по расширению файла)
+        :param compression: сжатие (CSV - 'gzip', 'bz2', 'xz'; Parquet - 'snappy', 'zstd', ...)
+        :param batch_size: размер пачки чтения (по умолчанию MAX_CNT_STREAM_BATCH)
+        :param row_group_size: кол-во строк в row group Parquet
+        :return:
+            * {} - статистика выгрузки (rows, bytes, duration, rows_per_sec, bytes_per_sec, ...)
+            * None - exceptions exists or errors
+        """
+        sql = sql_template.rstrip().rstrip(";") if sql_template else sql
+        batch_size = batch_size if batch_size else self.MAX_CNT_STREAM_BATCH
+        limit = self.MAX_CNT_FAST_DEBUG if self.fast_debug else None
+        if QLogger.is_enabled():
+            QLogger.log(sql, db_info=self.db_info())
+        start_time = time.perf_counter()
+        # в autocommit режиме именованный курсор живет только внутри транзакции - нужен WITH HOLD
+        with self._db_connection.cursor(name=f"export_{id(self)}_{time.monotonic_ns()}",
+                                        withhold=self.autocommit) as cursor:
+            cursor.itersize = batch_size
+            try:
+                cursor.execute(sql)
+                batch = cursor.fetchmany(batch_size if limit is None else min(batch_size, limit))
+                exporter = ResultExporter(path, names=[d[0] for d in cursor.description],
+                                          types=self._export_types(cursor.description), fmt=fmt,
+                                          compression=compression, row_group_size=row_group_size)
+                with exporter:
+                    while batch:
+                        exporter.write(batch)
+                        if limit is not None and exporter.cnt_rows >= limit:
+                            break
+                        batch = cursor.fetchmany(batch_size if limit is None else
+                                                 min(batch_size, limit - exporter.cnt_rows))
+                if Metrics.enabled:
+                    Metrics.record("postgres", sql, time.perf_counter() - start_time, rows=exporter.cnt_rows,
+                                   bytes_sent=len(sql))
+            except Exception as inst:
+                if Metrics.enabled:
+                    Metrics.record("postgres", sql, time.perf_counter() - start_time, bytes_sent=len(sql), error=True)
+                raise DbSqlQueryExceptionSLL(
+                    db_info=self.db_info(),
+                    sql=sql,
+                    sql_args_data=None,
+                    message=f"Error in func {other.who_am_i()!r}\n",
+                    inst=inst)
+        return exporter.log_stats()
@@ -4,6 +4,7 @@ from ..logger import CLogger, Color, ScriptCriticalExceptionSLL, sll_exception_c
 from ..locker import Locker
 from ..profiler import Profiler
 from ..cfg import CFG
+from ..metrics import Metrics
 
 
 class Script:
@@ -190,6 +191,7 @@ class Script:
         return self
 
     def __exit__(self, type_e, value_e, traceback_e):
+        Metrics.dump()
         if type_e is None:
             self.finish_success_info()
             if self.namespace.__contains__('verbose'):
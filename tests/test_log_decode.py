@@ -0,0 +1,45 @@
+import importlib
+import json
+import os
+import pickle
+import sys
+
+import pytest
+
+# репозиторий - сам пакет (относительные импорты), импортируется по имени каталога
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(ROOT))
+sll_logger = importlib.import_module(f"{os.path.basename(ROOT)}.logger")
+sll_mysql = importlib.import_module(f"{os.path.basename(ROOT)}.mysql")
+
+DB_CONFIG = {"host": "localhost", "port": 3306, "user": "", "pass": "", "name_db": "log"}
+
+
+def log_record(i: int, json_data: str = None) -> tuple:
+    data = json_data if json_data is not None else json.dumps({"crc": i, "time": "2020-03-01 10:00:00", "event": 1})
+    return i, 1, i, data, "2020-03-01 10:00:00"
+
+
+def test_exception_sll_pickle():
+    inst = sll_logger.DbCriticalExceptionSLL(message="decode error", inst=ValueError("bad json"))
+    restored = pickle.loads(pickle.dumps(inst))
+    assert type(restored) is sll_logger.DbCriticalExceptionSLL
+    assert str(restored) == str(inst)
+    assert repr(restored.inst) == repr(inst.inst)
+
+
+def test_decode_log_data_parallel():
+    db = sll_mysql.LogDB(DB_CONFIG, type_log=1)
+    batches = [[log_record(i) for i in range(1, 11)], [log_record(i) for i in range(11, 21)]]
+    db.iter_select = lambda sql, batch_size: (batch for batch in batches)
+    result = []
+    db._decode_log_data_parallel("SELECT", workers=2, merge=result.extend)
+    assert [d["crc"] for d in result] == list(range(1, 21))
+
+
+def test_decode_log_data_parallel_failing_chunk():
+    db = sll_mysql.LogDB(DB_CONFIG, type_log=1)
+    batches = [[log_record(i) for i in range(1, 11)], [log_record(11, "{not json")]]
+    db.iter_select = lambda sql, batch_size: (batch for batch in batches)
+    with pytest.raises(sll_logger.DbCriticalExceptionSLL, match="While parse log data"):
+        db._decode_log_data_parallel("SELECT", workers=2, merge=[].extend)